@@ -0,0 +1,209 @@
+import base64
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from instrumentation import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+COMPRESSION_THRESHOLD = int(os.environ.get('COMPRESSION_THRESHOLD', '1024'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Статус, который модерация ставит одобренным заявкам (см. src/pages/Admin.tsx)
+APPROVED_STATUS = 'approved'
+
+
+def dumps(obj: Any) -> str:
+    with phase('serialize'):
+        if orjson is not None:
+            return orjson.dumps(obj).decode()
+        return json.dumps(obj)
+
+
+def loads(raw: Optional[str]) -> Any:
+    with phase('parse'):
+        if orjson is not None:
+            return orjson.loads(raw or '{}')
+        return json.loads(raw or '{}')
+
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def weak_etag(etag: str) -> str:
+    return etag if etag.startswith('W/') else f'W/{etag}'
+
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    '''
+    Слабое сравнение из If-None-Match: префикс W/ игнорируется с обеих сторон.
+    '''
+    if_none_match = get_header(event, 'If-None-Match')
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in candidates
+
+
+def negotiate_encoding(event: Dict[str, Any], available: Tuple[str, ...]) -> Optional[str]:
+    header = get_header(event, 'Accept-Encoding')
+    if not header:
+        return None
+
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress_response(response: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Сжимает текстовое тело ответа в br или gzip по Accept-Encoding, если оно
+    не меньше COMPRESSION_THRESHOLD. Платформа требует бинарное тело в base64.
+    Сильный ETag сжатого тела становится слабым: байты зависят от кодировки.
+    '''
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str) or len(body) < COMPRESSION_THRESHOLD:
+        return response
+
+    headers = response.setdefault('headers', {})
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = negotiate_encoding(event, ('br', 'gzip') if brotli is not None else ('gzip',))
+    if encoding is None:
+        return response
+
+    with phase('compress'):
+        raw = body.encode()
+        if encoding == 'br':
+            data = brotli.compress(raw, quality=BROTLI_QUALITY)
+        else:
+            import gzip
+            data = gzip.compress(raw, GZIP_LEVEL)
+
+    headers['Content-Encoding'] = encoding
+    if 'ETag' in headers:
+        headers['ETag'] = weak_etag(headers['ETag'])
+    response['body'] = base64.b64encode(data).decode()
+    response['isBase64Encoded'] = True
+    return response
+
+
+def conditional_response(response: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Слабый ETag по хэшу тела; при совпадении с If-None-Match тело не отдаётся.
+    '''
+    if response['statusCode'] != 200:
+        return response
+
+    etag = f'W/"{hashlib.blake2b(response["body"].encode(), digest_size=16).hexdigest()}"'
+    response['headers']['ETag'] = etag
+    if etag_matches(event, etag):
+        headers = {key: value for key, value in response['headers'].items() if key != 'Content-Type'}
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'body': '',
+            'isBase64Encoded': False
+        }
+    return response
+
+
+def json_response(status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else dict(JSON_HEADERS),
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(status: int, message: str) -> Dict[str, Any]:
+    return json_response(status, {'error': message})
+
+
+class Router:
+    '''
+    Таблица маршрутов (метод, action) -> функция. Ответ на OPTIONS собирается
+    один раз; соединение с БД берётся из session_factory только если маршрут
+    действительно обращается к session.cur. Крупные ответы сжимаются.
+    '''
+
+    def __init__(self, methods: str, allow_headers: str, session_factory: Optional[Callable[[], Any]] = None):
+        self.preflight_headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': '86400'
+        }
+        self.session_factory = session_factory
+        self.routes: Dict[Tuple[str, Optional[str]], Callable[..., Dict[str, Any]]] = {}
+
+    def route(self, method: str, action: Optional[str] = None):
+        def register(func: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+            self.routes[(method, action)] = func
+            return func
+        return register
+
+    def dispatch(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        method = event.get('httpMethod', 'GET')
+        if method == 'OPTIONS':
+            return {
+                'statusCode': 200,
+                'headers': dict(self.preflight_headers),
+                'body': '',
+                'isBase64Encoded': False
+            }
+
+        action = (event.get('queryStringParameters') or {}).get('action')
+        route = self.routes.get((method, action))
+        if route is None:
+            return error_response(405, 'Method not allowed')
+
+        if self.session_factory is None:
+            return compress_response(route(event), event)
+
+        session = self.session_factory()
+        try:
+            response = route(event, session)
+        except Exception as e:
+            session.rollback()
+            return error_response(500, str(e))
+        finally:
+            session.close()
+        return compress_response(response, event)
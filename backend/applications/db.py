@@ -0,0 +1,269 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, List, Sequence, Tuple
+
+from instrumentation import phase, record_fetch, record_query
+
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTHCHECK_INTERVAL', '30'))
+DB_PREPARE_STATEMENTS = os.environ.get('DB_PREPARE_STATEMENTS', '1') == '1'
+DB_PREPARED_STATEMENTS_MAX = int(os.environ.get('DB_PREPARED_STATEMENTS_MAX', '64'))
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+_cursor_factory = None
+_connection_factory = None
+
+
+def get_connection_factory():
+    global _connection_factory
+    if _connection_factory is not None:
+        return _connection_factory
+
+    import psycopg2.extensions
+
+    class PreparingConnection(psycopg2.extensions.connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared_statements = set()
+
+    _connection_factory = PreparingConnection
+    return _connection_factory
+
+
+def to_positional(query: str) -> str:
+    parts = query.split('%s')
+    return parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], start=1))
+
+
+def get_cursor_factory():
+    global _cursor_factory
+    if _cursor_factory is not None:
+        return _cursor_factory
+
+    import psycopg2.extensions
+
+    class InstrumentedCursor(psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            start = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                rows = self.rowcount if self.description is None else 0
+                record_query(time.perf_counter() - start, rows)
+
+        def fetchone(self):
+            start = time.perf_counter()
+            row = super().fetchone()
+            record_fetch(time.perf_counter() - start, 1 if row is not None else 0)
+            return row
+
+        def fetchmany(self, size=None):
+            start = time.perf_counter()
+            rows = super().fetchmany(size) if size is not None else super().fetchmany()
+            record_fetch(time.perf_counter() - start, len(rows))
+            return rows
+
+        def fetchall(self):
+            start = time.perf_counter()
+            rows = super().fetchall()
+            record_fetch(time.perf_counter() - start, len(rows))
+            return rows
+
+    _cursor_factory = InstrumentedCursor
+    return _cursor_factory
+
+
+class ConnectionPool:
+    '''
+    Пул соединений с Postgres, живущий всё время жизни тёплого контейнера.
+    Соединения, простаивающие дольше idle_timeout, закрываются; соединения,
+    простаивающие дольше healthcheck_interval, проверяются через SELECT 1
+    перед выдачей, а сломанные заменяются новыми.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, healthcheck_interval: float):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        with phase('db_connect'):
+            return self._getconn()
+
+    def _getconn(self):
+        while True:
+            with self._lock:
+                self._evict_idle(time.monotonic())
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._in_use >= self.max_size:
+                    raise PoolExhausted(f'All {self.max_size} connections are in use')
+                else:
+                    conn, last_used = None, 0.0
+                self._in_use += 1
+
+            if conn is None:
+                import psycopg2
+                try:
+                    return psycopg2.connect(
+                        self.dsn,
+                        connection_factory=get_connection_factory(),
+                        cursor_factory=get_cursor_factory()
+                    )
+                except Exception:
+                    with self._lock:
+                        self._in_use -= 1
+                    raise
+
+            if self._is_healthy(conn, time.monotonic() - last_used):
+                return conn
+
+            self._close(conn)
+            with self._lock:
+                self._in_use -= 1
+
+    def putconn(self, conn) -> None:
+        import psycopg2.extensions
+
+        with self._lock:
+            self._in_use -= 1
+
+        if conn.closed:
+            return
+
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            self._close(conn)
+            return
+
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._close(conn)
+                return
+
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _evict_idle(self, now: float) -> None:
+        fresh = []
+        for conn, last_used in self._idle:
+            if now - last_used > self.idle_timeout:
+                self._close(conn)
+            else:
+                fresh.append((conn, last_used))
+        self._idle = fresh
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        import psycopg2
+
+        if conn.closed:
+            return False
+        if idle_for < self.healthcheck_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class Session:
+    '''
+    Ленивое соединение на один вызов: берётся из пула при первом обращении
+    к conn или cur и возвращается в пул в close().
+    '''
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._conn = None
+        self._cur = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = self._pool.getconn()
+        return self._conn
+
+    @property
+    def cur(self):
+        if self._cur is None:
+            self._cur = self.conn.cursor()
+        return self._cur
+
+    def execute_prepared(self, query: str, params: Sequence[Any] = ()):
+        '''
+        Выполняет запрос с плейсхолдерами %s через PREPARE/EXECUTE: на тёплом
+        соединении текст запроса разбирается и планируется один раз.
+        Возвращает курсор для чтения результата.
+        '''
+        cur = self.cur
+        prepared = self.conn.prepared_statements
+        name = f"stmt_{hashlib.md5(query.encode()).hexdigest()[:16]}"
+
+        if name not in prepared:
+            if not DB_PREPARE_STATEMENTS or len(prepared) >= DB_PREPARED_STATEMENTS_MAX:
+                cur.execute(query, params)
+                return cur
+            cur.execute(f'PREPARE {name} AS {to_positional(query)}')
+            prepared.add(name)
+
+        if params:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cur.execute(f'EXECUTE {name}')
+        return cur
+
+    def rollback(self) -> None:
+        if self._conn is not None and not self._conn.closed:
+            self._conn.rollback()
+
+    def close(self) -> None:
+        if self._cur is not None:
+            self._cur.close()
+            self._cur = None
+        if self._conn is not None:
+            self._pool.putconn(self._conn)
+            self._conn = None
+
+
+pool = ConnectionPool(
+    DATABASE_URL,
+    max_size=DB_POOL_MAX_SIZE,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    healthcheck_interval=DB_POOL_HEALTHCHECK_INTERVAL
+)
+
+
+def open_session() -> Session:
+    return Session(pool)
@@ -1,262 +1,989 @@
+import base64
+import hashlib
+import hmac
+import io
 import json
 import os
-import psycopg2
-from datetime import datetime
-from typing import Dict, Any, Optional
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-DATABASE_URL = os.environ.get('DATABASE_URL', '')
+from core import (
+    APPROVED_STATUS, Router, conditional_response, dumps, error_response, etag_matches, get_header,
+    json_response, loads, weak_etag
+)
+from db import Session, open_session
+from instrumentation import instrument
+from qr import qr_hash, render_many
+from ratelimit import is_throttled, rate_limit_keys, throttled_response
+from snapshot import invalidate_snapshot
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+APPLICATION_FIELDS = (
+    'id', 'name', 'contact', 'twitch_link', 'about', 'status',
+    'twitch_user_id', 'twitch_display_name', 'twitch_avatar_url',
+    'twitch_email', 'qr_code', 'qr_hash', 'checked_in_at', 'season', 'created_at', 'updated_at'
+)
+LIST_FIELDS = (
+    'id', 'name', 'contact', 'status', 'created_at',
+    'twitch_display_name', 'twitch_avatar_url'
+)
+SUBMISSION_FIELDS = (
+    'name', 'contact', 'twitch_link', 'about',
+    'twitch_user_id', 'twitch_display_name', 'twitch_avatar_url', 'twitch_email'
+)
+COUNT_MODES = ('cached', 'estimated', 'exact', 'none')
+SEARCH_EXPRESSION = "(COALESCE(name, '') || ' ' || COALESCE(contact, '') || ' ' || COALESCE(twitch_display_name, ''))"
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    API для работы с заявками на участие в мероприятии
-    Args: event - httpMethod (GET, POST, PUT), body с данными заявки
-          context - объект с request_id, function_name
-    Returns: JSON с данными заявки или списком заявок
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+MAX_MULTI_FETCH = 500
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL', '30'))
+INGEST_MODE = os.environ.get('APPLICATION_INGEST_MODE', 'direct')
+DRAIN_BATCH_SIZE = int(os.environ.get('DRAIN_BATCH_SIZE', '500'))
+DRAIN_MAX_BATCHES = int(os.environ.get('DRAIN_MAX_BATCHES', '20'))
+DRAIN_TRIGGER_SIZE = int(os.environ.get('DRAIN_TRIGGER_SIZE', str(DRAIN_BATCH_SIZE)))
+DRAIN_TRIGGER_AGE = float(os.environ.get('DRAIN_TRIGGER_AGE', '10'))
+DRAIN_LOCK_ID = 4242013
+QR_CACHE_SIZE = 2000
+CHECKIN_SECRET = os.environ.get('CHECKIN_SECRET', '')
+QR_HEADERS = {
+    'Content-Type': 'image/svg+xml',
+    'Access-Control-Allow-Origin': '*',
+    'Cache-Control': 'public, max-age=31536000, immutable'
+}
+
+_count_cache: Dict[Optional[str], Tuple[float, int]] = {}
+_qr_cache: Dict[str, str] = {}
+
+GET_APPLICATION_QUERY = f"SELECT {', '.join(APPLICATION_FIELDS)} FROM applications WHERE id = %s"
+GET_ARCHIVED_APPLICATION_QUERY = f"SELECT {', '.join(APPLICATION_FIELDS)} FROM applications_archive WHERE id = %s AND season = %s"
+GET_APPLICATIONS_BY_IDS_QUERY = f"SELECT {', '.join(APPLICATION_FIELDS)} FROM applications WHERE id = ANY(%s)"
+GET_ARCHIVED_APPLICATIONS_BY_IDS_QUERY = f"SELECT {', '.join(APPLICATION_FIELDS)} FROM applications_archive WHERE id = ANY(%s) AND season = %s"
+CURRENT_SEASON_QUERY = "SELECT current_season()"
+ARCHIVED_TOTAL_QUERY = "SELECT COUNT(*) FROM applications_archive WHERE season = %s"
+ARCHIVED_STATUS_TOTAL_QUERY = "SELECT COUNT(*) FROM applications_archive WHERE season = %s AND status = %s"
+TOTAL_QUERY = "SELECT COALESCE(SUM(total), 0)::bigint FROM application_status_counts"
+STATUS_TOTAL_QUERY = "SELECT COALESCE(SUM(total), 0)::bigint FROM application_status_counts WHERE status = %s"
+CHECK_IN_QUERY = f"""
+    UPDATE applications SET checked_in_at = CURRENT_TIMESTAMP
+    WHERE id = %s AND status = '{APPROVED_STATUS}' AND checked_in_at IS NULL
+    RETURNING name, twitch_display_name, checked_in_at
+"""
+
+def serialize_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def encode_cursor(created_at: datetime, app_id: int) -> str:
+    raw = f'{created_at.isoformat()}|{app_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, app_id = base64.urlsafe_b64decode(padded).decode().split('|', 1)
+    return datetime.fromisoformat(created_at), int(app_id)
+
+def parse_fields(raw: Optional[str]) -> List[str]:
+    if not raw:
+        return list(LIST_FIELDS)
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in APPLICATION_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def iter_export_chunks(conn, fmt: str, conditions: List[str], values: List[Any]) -> Iterator[str]:
+    import csv
     
+    query = f"SELECT {', '.join(APPLICATION_FIELDS)} FROM applications"
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    query += " ORDER BY created_at, id"
+    
+    export_cur = conn.cursor(name='applications_export')
+    export_cur.itersize = EXPORT_CHUNK_SIZE
     try:
-        if method == 'GET':
-            params = event.get('queryStringParameters', {})
-            app_id = params.get('id')
-            status_filter = params.get('status')
-            
-            if app_id:
-                cur.execute("""
-                    SELECT id, name, contact, twitch_link, about, status,
-                           twitch_user_id, twitch_display_name, twitch_avatar_url,
-                           twitch_email, qr_code, created_at, updated_at
-                    FROM applications WHERE id = %s
-                """, (app_id,))
-                row = cur.fetchone()
-                if not row:
-                    return {
-                        'statusCode': 404,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({'error': 'Application not found'}),
-                        'isBase64Encoded': False
-                    }
-                
-                application = {
-                    'id': row[0],
-                    'name': row[1],
-                    'contact': row[2],
-                    'twitch_link': row[3],
-                    'about': row[4],
-                    'status': row[5],
-                    'twitch_user_id': row[6],
-                    'twitch_display_name': row[7],
-                    'twitch_avatar_url': row[8],
-                    'twitch_email': row[9],
-                    'qr_code': row[10],
-                    'created_at': row[11].isoformat() if row[11] else None,
-                    'updated_at': row[12].isoformat() if row[12] else None
-                }
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps(application),
-                    'isBase64Encoded': False
-                }
+        export_cur.execute(query, values)
+        
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(APPLICATION_FIELDS)
+            yield buffer.getvalue()
+        
+        while True:
+            rows = export_cur.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
             
+            buffer = io.StringIO()
+            if fmt == 'csv':
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow([serialize_value(value) for value in row])
             else:
-                query = """
-                    SELECT id, name, contact, status, created_at,
-                           twitch_display_name, twitch_avatar_url
-                    FROM applications
-                """
-                
-                if status_filter:
-                    query += " WHERE status = %s"
-                    cur.execute(query + " ORDER BY created_at DESC", (status_filter,))
-                else:
-                    cur.execute(query + " ORDER BY created_at DESC")
-                
-                rows = cur.fetchall()
-                applications = []
                 for row in rows:
-                    applications.append({
-                        'id': row[0],
-                        'name': row[1],
-                        'contact': row[2],
-                        'status': row[3],
-                        'created_at': row[4].isoformat() if row[4] else None,
-                        'twitch_display_name': row[5],
-                        'twitch_avatar_url': row[6]
-                    })
-                
-                cur.execute("SELECT COUNT(*) FROM applications")
-                total_count = cur.fetchone()[0]
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'applications': applications,
-                        'total': total_count
-                    }),
-                    'isBase64Encoded': False
-                }
-        
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            
-            name = body.get('name')
-            contact = body.get('contact')
-            twitch_link = body.get('twitch_link')
-            about = body.get('about')
-            twitch_user = body.get('twitch_user', {})
-            
-            if not name or not contact:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Name and contact are required'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute("""
-                INSERT INTO applications (
-                    name, contact, twitch_link, about, status,
-                    twitch_user_id, twitch_display_name, twitch_avatar_url, twitch_email
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id, created_at
-            """, (
-                name, contact, twitch_link, about, 'new',
-                twitch_user.get('id'),
-                twitch_user.get('display_name'),
-                twitch_user.get('profile_image_url'),
-                twitch_user.get('email')
+                    record = {field: serialize_value(value) for field, value in zip(APPLICATION_FIELDS, row)}
+                    buffer.write(json.dumps(record, ensure_ascii=False))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+    finally:
+        export_cur.close()
+
+def validate_batch_items(items: List[Any]) -> Tuple[List[tuple], List[Dict[str, Any]]]:
+    rows = []
+    results = []
+    seen = set()
+    for item in items:
+        app_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(app_id, int) or isinstance(app_id, bool):
+            results.append({'id': app_id, 'result': 'invalid', 'error': 'Application ID is required'})
+        elif app_id in seen:
+            results.append({'id': app_id, 'result': 'invalid', 'error': 'Duplicate application ID in batch'})
+        elif 'status' not in item and 'qr_code' not in item:
+            results.append({'id': app_id, 'result': 'invalid', 'error': 'No fields to update'})
+        else:
+            seen.add(app_id)
+            rows.append((
+                app_id,
+                'status' in item, item.get('status'),
+                'qr_code' in item, item.get('qr_code')
             ))
-            
-            result = cur.fetchone()
-            app_id = result[0]
-            created_at = result[1]
-            
-            conn.commit()
-            
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'id': app_id,
-                    'message': 'Application created successfully',
-                    'created_at': created_at.isoformat()
-                }),
-                'isBase64Encoded': False
-            }
+            results.append({'id': app_id, 'result': None})
+    return rows, results
+
+def sign_ticket(app_id: int) -> str:
+    digest = hmac.new(CHECKIN_SECRET.encode(), str(app_id).encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode()
+
+def verify_ticket(token: Any) -> Optional[int]:
+    if not isinstance(token, str):
+        return None
+    parts = token.split(':')
+    if len(parts) != 3 or parts[0] != 'brotherhood' or not (parts[1].isascii() and parts[1].isdigit()):
+        return None
+    app_id = int(parts[1])
+    if not hmac.compare_digest(parts[2], sign_ticket(app_id)):
+        return None
+    return app_id
+
+def qr_payload(app_id: int) -> str:
+    return f'brotherhood:{app_id}:{sign_ticket(app_id)}'
+
+def cache_qr(digest: str, svg: str) -> None:
+    if len(_qr_cache) >= QR_CACHE_SIZE:
+        _qr_cache.pop(next(iter(_qr_cache)))
+    _qr_cache[digest] = svg
+
+def build_list_query(columns: List[str], by_status: bool, after_cursor: bool, archived: bool = False) -> str:
+    conditions = ['season = %s'] if archived else []
+    if by_status:
+        conditions.append('status = %s')
+    if after_cursor:
+        conditions.append('(created_at, id) < (%s, %s)')
+    
+    query = f"SELECT {', '.join(columns)} FROM {'applications_archive' if archived else 'applications'}"
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    return query + " ORDER BY created_at DESC, id DESC LIMIT %s"
+
+def build_search_query(columns: List[str], by_status: bool, after_cursor: bool, archived: bool = False) -> str:
+    matched_columns = columns if 'status' in columns else columns + ['status']
+    conditions = []
+    if by_status:
+        conditions.append('status = %s')
+    if after_cursor:
+        conditions.append('(created_at, id) < (%s, %s)')
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    return f"""
+        WITH matched AS (
+            SELECT {', '.join(matched_columns)} FROM {'applications_archive' if archived else 'applications'}
+            WHERE {'season = %s AND ' if archived else ''}{SEARCH_EXPRESSION} ILIKE %s
+        )
+        SELECT
+            (SELECT COALESCE(json_object_agg(COALESCE(status, ''), total), '{{}}'::json)
+             FROM (SELECT status, COUNT(*) AS total FROM matched GROUP BY status) AS facets),
+            (SELECT COALESCE(json_agg(json_build_array({', '.join(columns)}) ORDER BY created_at DESC, id DESC), '[]'::json)
+             FROM (
+                 SELECT {', '.join(columns)} FROM matched {where}
+                 ORDER BY created_at DESC, id DESC LIMIT %s
+             ) AS page)
+    """
+
+def search_applications(
+    db: Session,
+    search: str,
+    status_filter: Optional[str],
+    cursor: Optional[Tuple[datetime, int]],
+    columns: List[str],
+    limit: int,
+    archived_season: Optional[int] = None
+) -> Tuple[List[tuple], Dict[str, int]]:
+    pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    values: List[Any] = [pattern] if archived_season is None else [archived_season, pattern]
+    if status_filter:
+        values.append(status_filter)
+    if cursor:
+        values.extend(cursor)
+    values.append(limit + 1)
+    
+    query = build_search_query(columns, bool(status_filter), cursor is not None, archived_season is not None)
+    facets, page = db.execute_prepared(query, values).fetchone()
+    
+    rows = [(row[0], datetime.fromisoformat(row[1]) if row[1] else None) + tuple(row[2:]) for row in page]
+    return rows, facets
+
+def count_applications(db: Session, status_filter: Optional[str], mode: str) -> Optional[int]:
+    if mode == 'none':
+        return None
+    
+    if mode == 'estimated' and not status_filter:
+        db.cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'applications'::regclass")
+        estimate = db.cur.fetchone()[0]
+        if estimate >= 0:
+            return estimate
+    
+    now = time.monotonic()
+    if mode != 'exact':
+        cached = _count_cache.get(status_filter)
+        if cached and now - cached[0] < COUNT_CACHE_TTL:
+            return cached[1]
+    
+    if status_filter:
+        total = db.execute_prepared(STATUS_TOTAL_QUERY, (status_filter,)).fetchone()[0]
+    else:
+        total = db.execute_prepared(TOTAL_QUERY).fetchone()[0]
+    _count_cache[status_filter] = (now, total)
+    return total
+
+def count_archived_applications(db: Session, season: int, status_filter: Optional[str], mode: str) -> Optional[int]:
+    if mode == 'none':
+        return None
+    if status_filter:
+        return db.execute_prepared(ARCHIVED_STATUS_TOTAL_QUERY, (season, status_filter)).fetchone()[0]
+    return db.execute_prepared(ARCHIVED_TOTAL_QUERY, (season,)).fetchone()[0]
+
+router = Router(
+    methods='GET, POST, PUT, DELETE, OPTIONS',
+    allow_headers='Content-Type, X-Auth-Token, Idempotency-Key, If-None-Match',
+    session_factory=open_session
+)
+
+@router.route('GET', 'stats')
+def get_stats(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    db.cur.execute("SELECT status, total FROM application_status_counts WHERE total <> 0")
+    by_status = {status: total for status, total in db.cur.fetchall()}
+    return json_response(200, {
+        'total': sum(by_status.values()),
+        'by_status': by_status
+    })
+
+@router.route('GET', 'export')
+def export_applications(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    import gzip
+    
+    params = event.get('queryStringParameters') or {}
+    status_filter = params.get('status')
+    fmt = params.get('format') or 'csv'
+    conditions = []
+    values: List[Any] = []
+    
+    try:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        if status_filter:
+            conditions.append('status = %s')
+            values.append(status_filter)
+        if params.get('created_from'):
+            conditions.append('created_at >= %s')
+            values.append(datetime.fromisoformat(params['created_from']))
+        if params.get('created_to'):
+            conditions.append('created_at < %s')
+            values.append(datetime.fromisoformat(params['created_to']))
+    except ValueError as e:
+        return error_response(400, f'Invalid export parameters: {e}')
+    
+    output = io.BytesIO()
+    with gzip.GzipFile(fileobj=output, mode='wb') as compressed:
+        for chunk in iter_export_chunks(db.conn, fmt, conditions, values):
+            compressed.write(chunk.encode())
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': EXPORT_FORMATS[fmt],
+            'Content-Encoding': 'gzip',
+            'Content-Disposition': f'attachment; filename="applications.{fmt}"',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': base64.b64encode(output.getvalue()).decode(),
+        'isBase64Encoded': True
+    }
+
+@router.route('GET', 'qr')
+def get_qr_image(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    digest = (params.get('hash') or '').lower()
+    if len(digest) != 64:
+        return error_response(400, 'hash must be a sha256 hex digest')
+    
+    headers = {**QR_HEADERS, 'ETag': weak_etag(f'"{digest}"')}
+    if etag_matches(event, f'"{digest}"'):
+        del headers['Content-Type']
+        return {'statusCode': 304, 'headers': headers, 'body': '', 'isBase64Encoded': False}
+    
+    svg = _qr_cache.get(digest)
+    if svg is None:
+        db.cur.execute("SELECT svg FROM qr_images WHERE hash = %s", (digest,))
+        row = db.cur.fetchone()
+        if not row:
+            return error_response(404, 'QR code not found')
+        svg = row[0]
+        cache_qr(digest, svg)
+    
+    return {'statusCode': 200, 'headers': headers, 'body': svg, 'isBase64Encoded': False}
+
+@router.route('POST', 'qr')
+def generate_qr_codes(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    from psycopg2.extras import execute_values
+    
+    if not CHECKIN_SECRET:
+        return error_response(503, 'CHECKIN_SECRET is not configured')
+    
+    body = loads(event.get('body'))
+    ids = body.get('ids')
+    if ids is not None and (
+        not isinstance(ids, list) or len(ids) > MAX_BATCH_SIZE
+        or any(not isinstance(app_id, int) or isinstance(app_id, bool) for app_id in ids)
+    ):
+        return error_response(400, f'ids must be a list of at most {MAX_BATCH_SIZE} application IDs')
+    after_id = body.get('after_id')
+    if after_id is not None and (not isinstance(after_id, int) or isinstance(after_id, bool)):
+        return error_response(400, 'after_id must be an application ID')
+    
+    conditions = ['status = %s']
+    values: List[Any] = [APPROVED_STATUS]
+    if ids is not None:
+        conditions.append('id = ANY(%s)')
+        values.append(ids)
+    if not body.get('regenerate'):
+        conditions.append('qr_hash IS NULL')
+    if after_id is not None:
+        conditions.append('id > %s')
+        values.append(after_id)
+    where = ' AND '.join(conditions)
+    
+    cur = db.cur
+    cur.execute(f"SELECT id FROM applications WHERE {where} ORDER BY id LIMIT %s", values + [MAX_BATCH_SIZE])
+    items = [{'id': row[0], 'qr_code': qr_payload(row[0])} for row in cur.fetchall()]
+    for item in items:
+        item['qr_hash'] = qr_hash(item['qr_code'])
+    
+    if not items:
+        return json_response(200, {'items': [], 'rendered': 0, 'remaining': 0, 'next_after_id': None})
+    
+    last_id = items[-1]['id']
+    remaining = 0
+    if len(items) == MAX_BATCH_SIZE:
+        cur.execute(f"SELECT COUNT(*) FROM applications WHERE {where} AND id > %s", values + [last_id])
+        remaining = cur.fetchone()[0]
+    
+    cur.execute("SELECT hash FROM qr_images WHERE hash = ANY(%s)", ([item['qr_hash'] for item in items],))
+    stored = {row[0] for row in cur.fetchall()}
+    missing = [item for item in items if item['qr_hash'] not in stored]
+    
+    if missing:
+        rendered = render_many([item['qr_code'] for item in missing])
+        execute_values(cur, """
+            INSERT INTO qr_images (hash, payload, svg) VALUES %s
+            ON CONFLICT (hash) DO NOTHING
+        """, [
+            (item['qr_hash'], item['qr_code'], svg) for item, svg in zip(missing, rendered)
+        ], page_size=len(missing))
+        for item, svg in zip(missing, rendered):
+            cache_qr(item['qr_hash'], svg)
+    
+    execute_values(cur, """
+        UPDATE applications AS a
+        SET qr_code = v.qr_code, qr_hash = v.qr_hash, updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v(id, qr_code, qr_hash)
+        WHERE a.id = v.id
+    """, [(item['id'], item['qr_code'], item['qr_hash']) for item in items],
+        template='(%s::integer, %s::varchar, %s::char(64))',
+        page_size=len(items)
+    )
+    db.conn.commit()
+    
+    return json_response(200, {
+        'items': items,
+        'rendered': len(missing),
+        'remaining': remaining,
+        'next_after_id': last_id if remaining else None
+    })
+
+@router.route('POST', 'checkin')
+def check_in(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    if not CHECKIN_SECRET:
+        return error_response(503, 'CHECKIN_SECRET is not configured')
+    
+    body = loads(event.get('body'))
+    if 'items' in body:
+        return check_in_batch(body['items'], db)
+    
+    app_id = verify_ticket(body.get('token'))
+    if app_id is None:
+        return error_response(403, 'Invalid ticket')
+    
+    cur = db.cur
+    row = db.execute_prepared(CHECK_IN_QUERY, (app_id,)).fetchone()
+    if row:
+        db.conn.commit()
+        return json_response(200, {
+            'id': app_id,
+            'result': 'checked_in',
+            'name': row[0],
+            'twitch_display_name': row[1],
+            'checked_in_at': row[2].isoformat()
+        })
+    
+    cur.execute(
+        "SELECT name, twitch_display_name, checked_in_at, status FROM applications WHERE id = %s",
+        (app_id,)
+    )
+    row = cur.fetchone()
+    if not row or row[3] != APPROVED_STATUS:
+        return error_response(404, 'Ticket is not valid for entry')
+    
+    return json_response(409, {
+        'id': app_id,
+        'result': 'already_checked_in',
+        'name': row[0],
+        'twitch_display_name': row[1],
+        'checked_in_at': row[2].isoformat()
+    })
+
+def parse_scanned_at(raw: str) -> datetime:
+    '''
+    Время сканирования из офлайн-очереди приводится к UTC без смещения;
+    значения без смещения считаются UTC. В БД оно переводится во время
+    сессии, как и CURRENT_TIMESTAMP при онлайн-сканировании.
+    '''
+    scanned_at = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return scanned_at
+
+def check_in_batch(items: Any, db: Session) -> Dict[str, Any]:
+    from psycopg2.extras import execute_values
+    
+    if not isinstance(items, list) or not items or len(items) > MAX_BATCH_SIZE:
+        return error_response(400, f'items must be a list of 1 to {MAX_BATCH_SIZE} scans')
+    
+    results = []
+    scans: Dict[int, datetime] = {}
+    for item in items:
+        token = item.get('token') if isinstance(item, dict) else None
+        app_id = verify_ticket(token)
+        try:
+            scanned_at = parse_scanned_at(item['scanned_at']) if app_id is not None else None
+        except (KeyError, TypeError, ValueError):
+            scanned_at = None
+        if app_id is None:
+            results.append({'token': token, 'result': 'invalid', 'error': 'Invalid ticket'})
+        elif scanned_at is None:
+            results.append({'token': token, 'id': app_id, 'result': 'invalid', 'error': 'scanned_at must be an ISO timestamp'})
+        else:
+            if app_id not in scans or scanned_at < scans[app_id]:
+                scans[app_id] = scanned_at
+            results.append({'token': token, 'id': app_id, 'result': None})
+    
+    outcome: Dict[int, Tuple[str, Optional[datetime]]] = {}
+    if scans:
+        cur = db.cur
+        checked_in = execute_values(cur, f"""
+            UPDATE applications AS a SET checked_in_at = v.scanned_at
+            FROM (VALUES %s) AS v(id, scanned_at)
+            WHERE a.id = v.id AND a.status = '{APPROVED_STATUS}' AND a.checked_in_at IS NULL
+            RETURNING a.id, a.checked_in_at
+        """, list(scans.items()),
+            template="(%s::integer, %s::timestamp AT TIME ZONE 'UTC')",
+            page_size=len(scans),
+            fetch=True
+        )
+        outcome = {row[0]: ('checked_in', row[1]) for row in checked_in}
         
-        elif method == 'PUT':
-            body = json.loads(event.get('body', '{}'))
-            app_id = body.get('id')
-            
-            if not app_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Application ID is required'}),
-                    'isBase64Encoded': False
-                }
-            
-            updates = []
-            values = []
-            
-            if 'status' in body:
-                updates.append('status = %s')
-                values.append(body['status'])
-            
-            if 'qr_code' in body:
-                updates.append('qr_code = %s')
-                values.append(body['qr_code'])
-            
-            if not updates:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'No fields to update'}),
-                    'isBase64Encoded': False
-                }
-            
-            updates.append('updated_at = CURRENT_TIMESTAMP')
-            values.append(app_id)
-            
-            query = f"UPDATE applications SET {', '.join(updates)} WHERE id = %s"
-            cur.execute(query, values)
-            conn.commit()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Application updated successfully'}),
-                'isBase64Encoded': False
-            }
+        rest = [app_id for app_id in scans if app_id not in outcome]
+        if rest:
+            cur.execute("SELECT id, status, checked_in_at FROM applications WHERE id = ANY(%s)", (rest,))
+            for app_id, status, checked_in_at in cur.fetchall():
+                if status == APPROVED_STATUS:
+                    outcome[app_id] = ('already_checked_in', checked_in_at)
+        db.conn.commit()
+    
+    for result in results:
+        if result['result'] is None:
+            state, checked_in_at = outcome.get(result['id'], ('not_valid', None))
+            result['result'] = state
+            result['checked_in_at'] = serialize_value(checked_in_at)
+    
+    return json_response(200, {
+        'results': results,
+        'checked_in': sum(1 for state, _ in outcome.values() if state == 'checked_in')
+    })
+
+@router.route('GET')
+def get_applications(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    
+    try:
+        archived_season = resolve_archived_season(params.get('season'), db)
+    except ValueError:
+        return error_response(400, 'season must be a year')
+    
+    if params.get('ids'):
+        return conditional_response(get_applications_by_ids(params['ids'], db, archived_season), event)
+    if params.get('id'):
+        return conditional_response(get_application(params['id'], db, archived_season), event)
+    return conditional_response(list_applications(params, db, archived_season), event)
+
+def resolve_archived_season(raw: Optional[str], db: Session) -> Optional[int]:
+    '''
+    Номер прошедшего сезона, если запрошен он; текущий сезон живёт в
+    applications, закрытые — в applications_archive.
+    '''
+    if not raw:
+        return None
+    season = int(raw)
+    if season >= db.execute_prepared(CURRENT_SEASON_QUERY).fetchone()[0]:
+        return None
+    return season
+
+def get_application(app_id: str, db: Session, archived_season: Optional[int] = None) -> Dict[str, Any]:
+    if archived_season is None:
+        row = db.execute_prepared(GET_APPLICATION_QUERY, (app_id,)).fetchone()
+    else:
+        row = db.execute_prepared(GET_ARCHIVED_APPLICATION_QUERY, (app_id, archived_season)).fetchone()
+    if not row:
+        return error_response(404, 'Application not found')
+    
+    return json_response(200, {field: serialize_value(value) for field, value in zip(APPLICATION_FIELDS, row)})
+
+def get_applications_by_ids(raw_ids: str, db: Session, archived_season: Optional[int] = None) -> Dict[str, Any]:
+    try:
+        ids = list(dict.fromkeys(int(app_id) for app_id in raw_ids.split(',') if app_id.strip()))
+    except ValueError:
+        return error_response(400, 'ids must be a comma-separated list of application IDs')
+    if not ids or len(ids) > MAX_MULTI_FETCH:
+        return error_response(400, f'ids must contain 1 to {MAX_MULTI_FETCH} application IDs')
+    
+    if archived_season is None:
+        rows = db.execute_prepared(GET_APPLICATIONS_BY_IDS_QUERY, (ids,)).fetchall()
+    else:
+        rows = db.execute_prepared(GET_ARCHIVED_APPLICATIONS_BY_IDS_QUERY, (ids, archived_season)).fetchall()
+    
+    found = {
+        row[0]: {field: serialize_value(value) for field, value in zip(APPLICATION_FIELDS, row)}
+        for row in rows
+    }
+    
+    return json_response(200, {
+        'applications': [found[app_id] for app_id in ids if app_id in found],
+        'missing': [app_id for app_id in ids if app_id not in found]
+    })
+
+def list_applications(params: Dict[str, Any], db: Session, archived_season: Optional[int] = None) -> Dict[str, Any]:
+    status_filter = params.get('status')
+    
+    try:
+        fields = parse_fields(params.get('fields'))
+        limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        limit = min(limit, MAX_PAGE_SIZE)
+        cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+        count_mode = params.get('count') or 'cached'
+        if count_mode not in COUNT_MODES:
+            raise ValueError(f"count must be one of: {', '.join(COUNT_MODES)}")
+    except (ValueError, TypeError) as e:
+        return error_response(400, f'Invalid list parameters: {e}')
+    
+    columns = ['id', 'created_at'] + [field for field in fields if field not in ('id', 'created_at')]
+    search = (params.get('q') or '').strip()
+    facets = None
+    
+    if search:
+        rows, facets = search_applications(db, search, status_filter, cursor, columns, limit, archived_season)
+    else:
+        values: List[Any] = [] if archived_season is None else [archived_season]
+        if status_filter:
+            values.append(status_filter)
+        if cursor:
+            values.extend(cursor)
+        values.append(limit + 1)
         
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        query = build_list_query(columns, bool(status_filter), cursor is not None, archived_season is not None)
+        rows = db.execute_prepared(query, values).fetchall()
     
-    finally:
-        cur.close()
-        conn.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    applications = []
+    for row in rows:
+        record = dict(zip(columns, row))
+        applications.append({field: serialize_value(record[field]) for field in fields})
+    
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    
+    if facets is not None:
+        total_count = facets.get(status_filter, 0) if status_filter else sum(facets.values())
+    elif archived_season is not None:
+        total_count = count_archived_applications(db, archived_season, status_filter, count_mode)
+    else:
+        total_count = count_applications(db, status_filter, count_mode)
+    
+    result = {
+        'applications': applications,
+        'total': total_count,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+    if facets is not None:
+        result['facets'] = facets
+    
+    return json_response(200, result)
+
+@router.route('POST')
+def create_application(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    body = loads(event.get('body'))
+    twitch_user = body.get('twitch_user') or {}
+    
+    submission = {
+        'name': body.get('name'),
+        'contact': body.get('contact'),
+        'twitch_link': body.get('twitch_link'),
+        'about': body.get('about'),
+        'twitch_user_id': twitch_user.get('id'),
+        'twitch_display_name': twitch_user.get('display_name'),
+        'twitch_avatar_url': twitch_user.get('profile_image_url'),
+        'twitch_email': twitch_user.get('email')
+    }
+    
+    if not submission['name'] or not submission['contact']:
+        return error_response(400, 'Name and contact are required')
+    
+    idempotency_key = get_header(event, 'Idempotency-Key') or body.get('idempotency_key')
+    
+    # Повтор с тем же ключом ничего не пишет, поэтому отвечаем на него до лимита
+    if idempotency_key:
+        existing = find_submitted(idempotency_key, db)
+        if existing is not None:
+            return existing
+    
+    if is_throttled(rate_limit_keys(event, submission['twitch_user_id']), db):
+        return throttled_response()
+    
+    if INGEST_MODE == 'buffered':
+        return enqueue_submission(submission, idempotency_key, db)
+    
+    twitch_user_id = submission['twitch_user_id']
+    cur = db.cur
+    cur.execute(f"""
+        INSERT INTO applications ({', '.join(SUBMISSION_FIELDS)}, status, idempotency_key)
+        VALUES ({', '.join(['%s'] * len(SUBMISSION_FIELDS))}, 'new', %s)
+        ON CONFLICT DO NOTHING
+        RETURNING id, created_at
+    """, [submission[field] for field in SUBMISSION_FIELDS] + [idempotency_key])
+    result = cur.fetchone()
+    created = result is not None
+    
+    if created:
+        db.conn.commit()
+        _count_cache.clear()
+    elif idempotency_key:
+        cur.execute(
+            "SELECT id, created_at FROM applications WHERE idempotency_key = %s OR twitch_user_id = %s",
+            (idempotency_key, twitch_user_id)
+        )
+        result = cur.fetchone()
+    else:
+        cur.execute(
+            "SELECT id, created_at FROM applications WHERE twitch_user_id = %s",
+            (twitch_user_id,)
+        )
+        result = cur.fetchone()
+    
+    return application_created_response(result, created)
+
+def application_created_response(result: tuple, created: bool) -> Dict[str, Any]:
+    return json_response(201 if created else 200, {
+        'id': result[0],
+        'message': 'Application created successfully' if created else 'Application already exists',
+        'created_at': result[1].isoformat(),
+        'created': created
+    })
+
+def submission_accepted_response(result: tuple, accepted: bool) -> Dict[str, Any]:
+    return json_response(202 if accepted else 200, {
+        'submission_id': result[0],
+        'message': 'Application accepted for processing' if accepted else 'Application already submitted',
+        'submitted_at': result[1].isoformat(),
+        'created': accepted
+    })
+
+def find_submitted(idempotency_key: str, db: Session) -> Optional[Dict[str, Any]]:
+    cur = db.cur
+    if INGEST_MODE == 'buffered':
+        cur.execute(
+            "SELECT id, submitted_at FROM application_submissions WHERE idempotency_key = %s",
+            (idempotency_key,)
+        )
+        result = cur.fetchone()
+        return submission_accepted_response(result, False) if result else None
+    
+    cur.execute(
+        "SELECT id, created_at FROM applications WHERE idempotency_key = %s",
+        (idempotency_key,)
+    )
+    result = cur.fetchone()
+    return application_created_response(result, False) if result else None
+
+def enqueue_submission(submission: Dict[str, Any], idempotency_key: Optional[str], db: Session) -> Dict[str, Any]:
+    cur = db.cur
+    cur.execute("""
+        INSERT INTO application_submissions (idempotency_key, payload)
+        VALUES (%s, %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id, submitted_at
+    """, (idempotency_key or str(uuid.uuid4()), dumps(submission)))
+    result = cur.fetchone()
+    accepted = result is not None
+    
+    if accepted:
+        db.conn.commit()
+        drain_if_backlogged(db)
+    else:
+        cur.execute(
+            "SELECT id, submitted_at FROM application_submissions WHERE idempotency_key = %s",
+            (idempotency_key,)
+        )
+        result = cur.fetchone()
+    
+    return submission_accepted_response(result, accepted)
+
+def drain_if_backlogged(db: Session) -> None:
+    '''
+    Разбирает одну пачку очереди прямо из приёма заявки, когда в ней набралось
+    DRAIN_TRIGGER_SIZE заявок или самая старая ждёт дольше DRAIN_TRIGGER_AGE
+    секунд. Пачку разбирает только один вызов, остальные не ждут блокировку.
+    '''
+    cur = db.cur
+    cur.execute("""
+        SELECT COUNT(*), EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(submitted_at))
+        FROM (
+            SELECT submitted_at FROM application_submissions
+            WHERE processed_at IS NULL
+            ORDER BY id
+            LIMIT %s
+        ) AS pending
+    """, (DRAIN_TRIGGER_SIZE,))
+    pending, oldest_age = cur.fetchone()
+    if pending < DRAIN_TRIGGER_SIZE and (oldest_age or 0) < DRAIN_TRIGGER_AGE:
+        db.conn.commit()
+        return
+    
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (DRAIN_LOCK_ID,))
+    if not cur.fetchone()[0]:
+        db.conn.commit()
+        return
+    
+    _, created = drain_submission_batch(db, DRAIN_BATCH_SIZE)
+    if created:
+        _count_cache.clear()
+
+@router.route('GET', 'submission')
+def get_submission(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    db.cur.execute(
+        "SELECT id, submitted_at, processed_at, application_id FROM application_submissions WHERE id = %s",
+        (params.get('id'),)
+    )
+    row = db.cur.fetchone()
+    if not row:
+        return error_response(404, 'Submission not found')
+    
+    return json_response(200, {
+        'submission_id': row[0],
+        'status': 'processed' if row[2] else 'pending',
+        'submitted_at': serialize_value(row[1]),
+        'processed_at': serialize_value(row[2]),
+        'application_id': row[3]
+    })
+
+@router.route('POST', 'drain')
+def drain_submissions(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    drained = 0
+    created = 0
+    for _ in range(DRAIN_MAX_BATCHES):
+        batch_drained, batch_created = drain_submission_batch(db, DRAIN_BATCH_SIZE)
+        drained += batch_drained
+        created += batch_created
+        if batch_drained < DRAIN_BATCH_SIZE:
+            break
+    
+    if created:
+        _count_cache.clear()
+    
+    return json_response(200, {'drained': drained, 'created': created})
+
+def drain_submission_batch(db: Session, batch_size: int) -> Tuple[int, int]:
+    from psycopg2.extras import execute_values
+    
+    cur = db.cur
+    cur.execute("""
+        SELECT id, idempotency_key, payload, submitted_at FROM application_submissions
+        WHERE processed_at IS NULL
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (batch_size,))
+    batch = cur.fetchall()
+    if not batch:
+        db.conn.commit()
+        return 0, 0
+    
+    inserted = execute_values(cur, f"""
+        INSERT INTO applications ({', '.join(SUBMISSION_FIELDS)}, status, idempotency_key, created_at)
+        VALUES %s
+        ON CONFLICT DO NOTHING
+        RETURNING id, idempotency_key
+    """, [
+        tuple(payload.get(field) for field in SUBMISSION_FIELDS) + ('new', key, submitted_at)
+        for _, key, payload, submitted_at in batch
+    ], page_size=len(batch), fetch=True)
+    application_ids = {key: app_id for app_id, key in inserted}
+    
+    pending = [row for row in batch if row[1] not in application_ids]
+    if pending:
+        cur.execute("""
+            SELECT id, idempotency_key, twitch_user_id FROM applications
+            WHERE idempotency_key = ANY(%s) OR twitch_user_id = ANY(%s)
+        """, (
+            [key for _, key, _, _ in pending],
+            [payload.get('twitch_user_id') for _, _, payload, _ in pending if payload.get('twitch_user_id')]
+        ))
+        by_key = {}
+        by_twitch_user = {}
+        for app_id, key, twitch_user_id in cur.fetchall():
+            by_key[key] = app_id
+            by_twitch_user[twitch_user_id] = app_id
+        for _, key, payload, _ in pending:
+            application_ids[key] = by_key.get(key) or by_twitch_user.get(payload.get('twitch_user_id'))
+    
+    execute_values(cur, """
+        UPDATE application_submissions AS s
+        SET processed_at = CURRENT_TIMESTAMP, application_id = v.application_id
+        FROM (VALUES %s) AS v(id, application_id)
+        WHERE s.id = v.id
+    """, [(submission_id, application_ids.get(key)) for submission_id, key, _, _ in batch],
+        template='(%s::bigint, %s::integer)',
+        page_size=len(batch)
+    )
+    db.conn.commit()
+    return len(batch), len(inserted)
+
+@router.route('PUT')
+def update_applications(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    body = loads(event.get('body'))
+    
+    if 'items' in body:
+        return update_applications_batch(body['items'], db)
+    
+    app_id = body.get('id')
+    
+    if not app_id:
+        return error_response(400, 'Application ID is required')
+    
+    updates = []
+    values = []
+    
+    if 'status' in body:
+        updates.append('status = %s')
+        values.append(body['status'])
+    
+    if 'qr_code' in body:
+        updates.append('qr_code = %s, qr_hash = NULL')
+        values.append(body['qr_code'])
+    
+    if not updates:
+        return error_response(400, 'No fields to update')
+    
+    updates.append('updated_at = CURRENT_TIMESTAMP')
+    values.append(app_id)
+    
+    query = f"UPDATE applications SET {', '.join(updates)} WHERE id = %s"
+    db.cur.execute(query, values)
+    if 'status' in body:
+        invalidate_snapshot(db)
+    db.conn.commit()
+    _count_cache.clear()
+    
+    return json_response(200, {'message': 'Application updated successfully'})
+
+def update_applications_batch(items: Any, db: Session) -> Dict[str, Any]:
+    from psycopg2.extras import execute_values
+    
+    if not isinstance(items, list) or not items or len(items) > MAX_BATCH_SIZE:
+        return error_response(400, f'items must be a list of 1 to {MAX_BATCH_SIZE} updates')
+    
+    rows, results = validate_batch_items(items)
+    updated_ids = set()
+    
+    if rows:
+        updated = execute_values(db.cur, """
+            UPDATE applications AS a
+            SET status = CASE WHEN v.set_status THEN v.status ELSE a.status END,
+                qr_code = CASE WHEN v.set_qr_code THEN v.qr_code ELSE a.qr_code END,
+                qr_hash = CASE WHEN v.set_qr_code THEN NULL ELSE a.qr_hash END,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, set_status, status, set_qr_code, qr_code)
+            WHERE a.id = v.id
+            RETURNING a.id
+        """, rows,
+            template='(%s::integer, %s::boolean, %s::varchar, %s::boolean, %s::varchar)',
+            page_size=len(rows),
+            fetch=True
+        )
+        updated_ids = {row[0] for row in updated}
+        if any(row[1] for row in rows):
+            invalidate_snapshot(db)
+        db.conn.commit()
+        _count_cache.clear()
+    
+    for result in results:
+        if result['result'] is None:
+            result['result'] = 'updated' if result['id'] in updated_ids else 'not_found'
+    
+    return json_response(200, {
+        'results': results,
+        'updated': len(updated_ids)
+    })
+
+@instrument
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    API для работы с заявками на участие в мероприятии
+    Args: event - httpMethod (GET, POST, PUT), body с данными заявки
+          context - объект с request_id, function_name
+    Returns: JSON с данными заявки или списком заявок
+    '''
+    return router.dispatch(event)
@@ -0,0 +1,110 @@
+import contextvars
+import functools
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_current: contextvars.ContextVar = contextvars.ContextVar('invocation_metrics', default=None)
+
+
+class InvocationMetrics:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.queries = 0
+        self.rows = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+def record_phase(name: str, seconds: float) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(name, seconds)
+
+
+def record_query(seconds: float, rows: int = 0) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add('db', seconds)
+        metrics.queries += 1
+        metrics.rows += max(rows, 0)
+
+
+def record_fetch(seconds: float, rows: int) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add('db', seconds)
+        metrics.rows += rows
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
+
+
+def server_timing(metrics: InvocationMetrics, total: float) -> str:
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in metrics.phases.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def instrument(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    '''
+    Оборачивает handler: замеряет фазы вызова, считает запросы и строки,
+    пишет одну JSON-строку лога на вызов и добавляет заголовок Server-Timing.
+    '''
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        metrics = InvocationMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = handler(event, context)
+            return response
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+            if response is not None:
+                headers = dict(response.get('headers') or {})
+                headers['Server-Timing'] = server_timing(metrics, total)
+                headers['Timing-Allow-Origin'] = '*'
+                response['headers'] = headers
+            log_invocation(event, context, response, metrics, total, error)
+    return wrapper
+
+
+def log_invocation(
+    event: Dict[str, Any],
+    context: Any,
+    response: Optional[Dict[str, Any]],
+    metrics: InvocationMetrics,
+    total: float,
+    error: Optional[str]
+) -> None:
+    record = {
+        'request_id': getattr(context, 'request_id', None),
+        'function_name': getattr(context, 'function_name', None),
+        'method': event.get('httpMethod'),
+        'action': (event.get('queryStringParameters') or {}).get('action'),
+        'status': response.get('statusCode') if response else 500,
+        'duration_ms': round(total * 1000, 2),
+        'phases_ms': {name: round(seconds * 1000, 2) for name, seconds in metrics.phases.items()},
+        'queries': metrics.queries,
+        'rows': metrics.rows,
+        'response_bytes': len(response.get('body') or '') if response else 0
+    }
+    if error:
+        record['error'] = error
+    sys.stdout.write(json.dumps(record) + '\n')
@@ -0,0 +1,42 @@
+import hashlib
+import io
+import os
+from typing import List
+
+QR_RENDER_VERSION = '1'
+QR_WORKERS = int(os.environ.get('QR_WORKERS', str(os.cpu_count() or 1)))
+QR_POOL_THRESHOLD = int(os.environ.get('QR_POOL_THRESHOLD', '64'))
+
+
+def qr_hash(payload: str) -> str:
+    return hashlib.sha256(f'{QR_RENDER_VERSION}:{payload}'.encode()).hexdigest()
+
+
+def render_svg(payload: str) -> str:
+    import segno
+
+    buffer = io.BytesIO()
+    segno.make_qr(payload, error='m').save(
+        buffer, kind='svg', scale=4, border=2,
+        xmldecl=False, svgclass=None, lineclass=None
+    )
+    return buffer.getvalue().decode()
+
+
+def render_many(payloads: List[str]) -> List[str]:
+    '''
+    Кодирование QR упирается в CPU и GIL, поэтому большие пачки
+    раскладываются по процессам. Если пул процессов недоступен в окружении,
+    пачка рендерится в текущем процессе.
+    '''
+    if QR_WORKERS < 2 or len(payloads) < QR_POOL_THRESHOLD:
+        return [render_svg(payload) for payload in payloads]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, len(payloads) // (QR_WORKERS * 4))
+    try:
+        with ProcessPoolExecutor(max_workers=QR_WORKERS) as executor:
+            return list(executor.map(render_svg, payloads, chunksize=chunksize))
+    except Exception:
+        return [render_svg(payload) for payload in payloads]
@@ -1,181 +1,319 @@
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import time
+from datetime import timezone
+from typing import Dict, Any, List, Optional, Tuple
 
-DATABASE_URL = os.environ.get('DATABASE_URL', '')
+from core import Router, dumps, error_response, etag_matches, json_response, loads, negotiate_encoding, weak_etag
+from db import Session, open_session
+from instrumentation import instrument
+from snapshot import build_snapshot, load_snapshot
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', '60'))
+SETTINGS_HISTORY_DEPTH = 100
+MAX_PATCH_OPERATIONS = 100
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+SETTINGS_FIELDS = (
+    'event_name', 'event_slogan', 'event_date', 'event_location',
+    'organizer_name', 'organizer_contact', 'program_data', 'about_content', 'season'
+)
+
+SETTINGS_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Expose-Headers': 'ETag, Last-Modified',
+    'Cache-Control': 'no-cache'
+}
+
+SNAPSHOT_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Expose-Headers': 'ETag',
+    'Cache-Control': 'public, max-age=30',
+    'Vary': 'Accept-Encoding'
+}
+
+SETTINGS_VERSION_QUERY = "SELECT id, version FROM event_settings ORDER BY id DESC LIMIT 1"
+SETTINGS_QUERY = f"""
+    SELECT id, version, updated_at, {', '.join(SETTINGS_FIELDS)}
+    FROM event_settings
+    ORDER BY id DESC
+    LIMIT 1
+"""
+SETTINGS_HISTORY_QUERY = """
+    SELECT version, changed_fields FROM event_settings_versions
+    WHERE version > %s AND version <= %s
+    ORDER BY version
+"""
+
+_settings_cache: Dict[str, Any] = {}
+
+def get_cached_settings() -> Optional[Dict[str, Any]]:
+    if _settings_cache and time.monotonic() < _settings_cache['expires_at']:
+        return _settings_cache
+    return None
+
+def store_settings_cache(
+    version: Optional[tuple],
+    settings: Dict[str, Any],
+    updated_at,
+    history: List[Tuple[int, List[str]]]
+) -> Dict[str, Any]:
+    from email.utils import format_datetime
+    
+    settings_version = version[1] if version else 0
+    
+    _settings_cache.clear()
+    _settings_cache.update({
+        'version': version,
+        'settings_version': settings_version,
+        'settings': settings,
+        'history': history,
+        'deltas': {},
+        'body': dumps({**settings, 'version': settings_version}),
+        'etag': weak_etag(f'"{version[0]}-{version[1]}"' if version else '"default"'),
+        'last_modified': format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True) if updated_at else None,
+        'expires_at': time.monotonic() + SETTINGS_CACHE_TTL
+    })
+    return _settings_cache
+
+def load_settings(db: Session) -> Dict[str, Any]:
+    version = db.execute_prepared(SETTINGS_VERSION_QUERY).fetchone()
+    
+    if _settings_cache and _settings_cache['version'] == version:
+        _settings_cache['expires_at'] = time.monotonic() + SETTINGS_CACHE_TTL
+        return _settings_cache
+    
+    row = db.execute_prepared(SETTINGS_QUERY).fetchone()
+    
+    if not row:
+        settings = dict.fromkeys(SETTINGS_FIELDS)
+        settings['event_name'] = '42 БРАТУХ'
+        return store_settings_cache(None, settings, None, [])
+    
+    settings = dict(zip(SETTINGS_FIELDS, row[3:]))
+    if settings['event_date']:
+        settings['event_date'] = settings['event_date'].isoformat()
+    
+    history = db.execute_prepared(SETTINGS_HISTORY_QUERY, (row[1] - SETTINGS_HISTORY_DEPTH, row[1])).fetchall()
+    
+    return store_settings_cache((row[0], row[1]), settings, row[2], history)
+
+def settings_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+    headers = {
+        **SETTINGS_HEADERS,
+        'ETag': entry['etag']
+    }
+    if entry['last_modified']:
+        headers['Last-Modified'] = entry['last_modified']
+    return headers
+
+def settings_response(entry: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    headers = settings_headers(entry)
+    
+    if etag_matches(event, entry['etag']):
+        del headers['Content-Type']
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': entry['body'],
+        'isBase64Encoded': False
+    }
+
+def delta_response(entry: Dict[str, Any], since_version: int) -> Dict[str, Any]:
     '''
-    API для управления настройками мероприятия
-    Args: event - httpMethod (GET, PUT), body с настройками
-          context - объект с request_id, function_name
-    Returns: JSON с настройками мероприятия
+    Только поля, изменённые после since_version. Если клиент уже актуален,
+    отвечаем 204 без тела; если его версия старше хранимой истории,
+    отдаём настройки целиком.
     '''
-    method: str = event.get('httpMethod', 'GET')
+    headers = settings_headers(entry)
     
-    if method == 'OPTIONS':
+    if since_version >= entry['settings_version']:
+        del headers['Content-Type']
         return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
+            'statusCode': 204,
+            'headers': headers,
             'body': '',
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    try:
-        if method == 'GET':
-            cur.execute("""
-                SELECT event_name, event_slogan, event_date, event_location,
-                       organizer_name, organizer_contact, program_data, about_content
-                FROM event_settings
-                ORDER BY id DESC
-                LIMIT 1
-            """)
-            
-            row = cur.fetchone()
-            
-            if row:
-                settings = {
-                    'event_name': row[0],
-                    'event_slogan': row[1],
-                    'event_date': row[2].isoformat() if row[2] else None,
-                    'event_location': row[3],
-                    'organizer_name': row[4],
-                    'organizer_contact': row[5],
-                    'program_data': row[6],
-                    'about_content': row[7]
-                }
-            else:
-                settings = {
-                    'event_name': '42 БРАТУХ',
-                    'event_slogan': None,
-                    'event_date': None,
-                    'event_location': None,
-                    'organizer_name': None,
-                    'organizer_contact': None,
-                    'program_data': None,
-                    'about_content': None
-                }
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(settings),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'PUT':
-            body = json.loads(event.get('body', '{}'))
-            
-            cur.execute("SELECT id FROM event_settings ORDER BY id DESC LIMIT 1")
-            existing = cur.fetchone()
-            
-            if existing:
-                updates = []
-                values = []
-                
-                if 'event_name' in body:
-                    updates.append('event_name = %s')
-                    values.append(body['event_name'])
-                
-                if 'event_slogan' in body:
-                    updates.append('event_slogan = %s')
-                    values.append(body['event_slogan'])
-                
-                if 'event_date' in body:
-                    updates.append('event_date = %s')
-                    values.append(body['event_date'])
-                
-                if 'event_location' in body:
-                    updates.append('event_location = %s')
-                    values.append(body['event_location'])
-                
-                if 'organizer_name' in body:
-                    updates.append('organizer_name = %s')
-                    values.append(body['organizer_name'])
-                
-                if 'organizer_contact' in body:
-                    updates.append('organizer_contact = %s')
-                    values.append(body['organizer_contact'])
-                
-                if 'program_data' in body:
-                    updates.append('program_data = %s')
-                    values.append(json.dumps(body['program_data']))
-                
-                if 'about_content' in body:
-                    updates.append('about_content = %s')
-                    values.append(body['about_content'])
-                
-                updates.append('updated_at = CURRENT_TIMESTAMP')
-                values.append(existing[0])
-                
-                query = f"UPDATE event_settings SET {', '.join(updates)} WHERE id = %s"
-                cur.execute(query, values)
-            else:
-                cur.execute("""
-                    INSERT INTO event_settings (
-                        event_name, event_slogan, event_date, event_location,
-                        organizer_name, organizer_contact, program_data, about_content
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    body.get('event_name', '42 БРАТУХ'),
-                    body.get('event_slogan'),
-                    body.get('event_date'),
-                    body.get('event_location'),
-                    body.get('organizer_name'),
-                    body.get('organizer_contact'),
-                    json.dumps(body.get('program_data')) if body.get('program_data') else None,
-                    body.get('about_content')
-                ))
-            
-            conn.commit()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Settings updated successfully'}),
-                'isBase64Encoded': False
-            }
-        
+    history = entry['history']
+    if not history or since_version < history[0][0] - 1:
         return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'statusCode': 200,
+            'headers': headers,
+            'body': entry['body'],
             'isBase64Encoded': False
         }
     
-    except Exception as e:
-        conn.rollback()
+    body = entry['deltas'].get(since_version)
+    if body is None:
+        changed = set()
+        for version, fields in history:
+            if version > since_version:
+                changed.update(fields)
+        delta = {field: entry['settings'][field] for field in SETTINGS_FIELDS if field in changed}
+        body = dumps({**delta, 'version': entry['settings_version'], 'delta': True})
+        entry['deltas'][since_version] = body
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def snapshot_response(entry: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    headers = {
+        **SNAPSHOT_HEADERS,
+        'ETag': weak_etag(entry['etag'])
+    }
+    
+    if etag_matches(event, entry['etag']):
+        del headers['Content-Type']
         return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
+            'statusCode': 304,
+            'headers': headers,
+            'body': '',
             'isBase64Encoded': False
         }
     
-    finally:
-        cur.close()
-        conn.close()
+    encoding = negotiate_encoding(event, ('br', 'gzip') if entry['br'] else ('gzip',))
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        return {'statusCode': 200, 'headers': headers, 'body': entry[encoding], 'isBase64Encoded': True}
+    
+    return {'statusCode': 200, 'headers': headers, 'body': entry['body'], 'isBase64Encoded': False}
+
+def build_program_patch(operations: Any) -> Tuple[Optional[str], List[Any]]:
+    '''
+    Превращает список операций {"op": "set"|"remove", "path": [...], "value": ...}
+    в цепочку jsonb_set / #- над program_data, чтобы Postgres правил документ
+    на месте, а клиент не пересылал программу целиком.
+    '''
+    if not isinstance(operations, list) or not operations or len(operations) > MAX_PATCH_OPERATIONS:
+        return None, []
+    
+    expression = "COALESCE(program_data, '{}'::jsonb)"
+    values: List[Any] = []
+    for operation in operations:
+        path = operation.get('path') if isinstance(operation, dict) else None
+        if not isinstance(path, list) or not path:
+            return None, []
+        path = [str(key) for key in path]
+        
+        if operation.get('op') == 'set' and 'value' in operation:
+            expression = f"jsonb_set({expression}, %s::text[], %s::jsonb, true)"
+            values.extend([path, json.dumps(operation['value'])])
+        elif operation.get('op') == 'remove':
+            expression = f"({expression} #- %s::text[])"
+            values.append(path)
+        else:
+            return None, []
+    
+    return expression, values
+
+router = Router(
+    methods='GET, PUT, OPTIONS',
+    allow_headers='Content-Type, X-Auth-Token, If-None-Match',
+    session_factory=open_session
+)
+
+@router.route('GET')
+def get_settings(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    params = event.get('queryStringParameters') or {}
+    since_version = params.get('since_version')
+    if since_version is not None and not since_version.isdigit():
+        return error_response(400, 'since_version must be a non-negative integer')
+    
+    entry = get_cached_settings() or load_settings(db)
+    
+    if since_version is None:
+        return settings_response(entry, event)
+    return delta_response(entry, int(since_version))
+
+@router.route('GET', 'public')
+def get_public_snapshot(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    return snapshot_response(load_snapshot(db), event)
+
+@router.route('PUT')
+def update_settings(event: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    body = loads(event.get('body'))
+    updates = []
+    values = []
+    changed = []
+    
+    for field in SETTINGS_FIELDS:
+        if field in body:
+            updates.append(f'{field} = %s')
+            values.append(json.dumps(body[field]) if field == 'program_data' else body[field])
+            changed.append(field)
+    
+    if 'program_patch' in body:
+        if 'program_data' in body:
+            return error_response(400, 'program_data and program_patch cannot be combined')
+        expression, patch_values = build_program_patch(body['program_patch'])
+        if expression is None:
+            return error_response(400, f'program_patch must be a list of 1 to {MAX_PATCH_OPERATIONS} set/remove operations')
+        updates.append(f'program_data = {expression}')
+        values.extend(patch_values)
+        changed.append('program_data')
+    
+    if not changed:
+        return error_response(400, 'No fields to update')
+    
+    cur = db.cur
+    archived = 0
+    if 'season' in body:
+        season = body['season']
+        if not isinstance(season, int) or isinstance(season, bool):
+            return error_response(400, 'season must be a year')
+        cur.execute("SELECT current_season()")
+        current_season = cur.fetchone()[0]
+        if season < current_season:
+            return error_response(400, 'season cannot move backwards')
+        if season > current_season:
+            cur.execute("SELECT archive_seasons_before(%s)", (season,))
+            archived = cur.fetchone()[0]
+    
+    cur.execute("SELECT id FROM event_settings ORDER BY id DESC LIMIT 1")
+    existing = cur.fetchone()
+    
+    if not existing:
+        cur.execute("INSERT INTO event_settings (version) VALUES (0) RETURNING id")
+        existing = cur.fetchone()
+    
+    updates.append('version = version + 1')
+    updates.append('updated_at = CURRENT_TIMESTAMP')
+    values.append(existing[0])
+    
+    cur.execute(f"UPDATE event_settings SET {', '.join(updates)} WHERE id = %s RETURNING version", values)
+    version = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO event_settings_versions (version, changed_fields) VALUES (%s, %s)
+        ON CONFLICT (version) DO UPDATE
+        SET changed_fields = EXCLUDED.changed_fields, created_at = CURRENT_TIMESTAMP
+    """, (version, changed))
+    
+    db.conn.commit()
+    _settings_cache.clear()
+    build_snapshot(db)
+    
+    return json_response(200, {'message': 'Settings updated successfully', 'version': version, 'archived': archived})
+
+@instrument
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    API для управления настройками мероприятия
+    Args: event - httpMethod (GET, PUT), since_version для дельты, body с настройками
+          context - объект с request_id, function_name
+    Returns: JSON с настройками мероприятия
+    '''
+    return router.dispatch(event)
@@ -0,0 +1,139 @@
+import base64
+import gzip
+import hashlib
+import os
+import time
+from datetime import date
+from typing import Any, Dict, Optional
+
+from core import APPROVED_STATUS, dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_CACHE_TTL = float(os.environ.get('SNAPSHOT_CACHE_TTL', '30'))
+SNAPSHOT_MAX_AGE = float(os.environ.get('SNAPSHOT_MAX_AGE', '60'))
+SNAPSHOT_BROTLI_QUALITY = 9
+
+SNAPSHOT_SETTINGS_FIELDS = (
+    'event_name', 'event_slogan', 'event_date', 'event_location',
+    'organizer_name', 'organizer_contact', 'program_data', 'about_content'
+)
+
+_snapshot_cache: Dict[str, Any] = {}
+
+
+def build_snapshot(db, wait: bool = True) -> Optional[Dict[str, Any]]:
+    '''
+    Собирает публичные данные лендинга (настройки, аватары одобренных
+    участников, счётчики) в один сериализованный и заранее сжатый блоб.
+    Сборки сериализуются advisory-локом; с wait=False сборка пропускается,
+    если её уже выполняет другой вызов.
+    '''
+    cur = db.cur
+    if wait:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('public_snapshot'))")
+    else:
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('public_snapshot'))")
+        if not cur.fetchone()[0]:
+            db.conn.rollback()
+            return None
+
+    cur.execute(f"""
+        SELECT version, {', '.join(SNAPSHOT_SETTINGS_FIELDS)}
+        FROM event_settings
+        ORDER BY id DESC
+        LIMIT 1
+    """)
+    row = cur.fetchone()
+    if row:
+        settings = dict(zip(SNAPSHOT_SETTINGS_FIELDS, row[1:]))
+        settings['version'] = row[0]
+    else:
+        settings = dict.fromkeys(SNAPSHOT_SETTINGS_FIELDS)
+        settings['event_name'] = '42 БРАТУХ'
+        settings['version'] = 0
+    if isinstance(settings['event_date'], date):
+        settings['event_date'] = settings['event_date'].isoformat()
+
+    cur.execute("""
+        SELECT twitch_display_name, twitch_avatar_url FROM applications
+        WHERE status = %s AND twitch_display_name IS NOT NULL
+        ORDER BY id
+    """, (APPROVED_STATUS,))
+    participants = [{'display_name': name, 'avatar_url': avatar} for name, avatar in cur.fetchall()]
+
+    cur.execute("SELECT status, total FROM application_status_counts WHERE total <> 0")
+    by_status = dict(cur.fetchall())
+
+    body = dumps({
+        'settings': settings,
+        'participants': participants,
+        'counts': {
+            'total': sum(by_status.values()),
+            'approved': by_status.get(APPROVED_STATUS, 0),
+            'by_status': by_status
+        }
+    })
+    raw = body.encode()
+    etag = f'"{hashlib.sha256(raw).hexdigest()[:32]}"'
+    body_gzip = gzip.compress(raw, 9)
+    body_br = brotli.compress(raw, quality=SNAPSHOT_BROTLI_QUALITY) if brotli is not None else None
+
+    cur.execute("""
+        INSERT INTO public_snapshot (id, etag, body, body_gzip, body_br, built_at)
+        VALUES (1, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (id) DO UPDATE
+        SET etag = EXCLUDED.etag, body = EXCLUDED.body, body_gzip = EXCLUDED.body_gzip,
+            body_br = EXCLUDED.body_br, built_at = EXCLUDED.built_at
+    """, (etag, body, body_gzip, body_br))
+    db.conn.commit()
+
+    return store_snapshot_cache(etag, body, body_gzip, body_br)
+
+
+def invalidate_snapshot(db) -> None:
+    '''
+    Помечает снимок устаревшим в текущей транзакции; пересоберёт его
+    ближайший публичный запрос.
+    '''
+    db.cur.execute("UPDATE public_snapshot SET built_at = '-infinity' WHERE id = 1")
+
+
+def store_snapshot_cache(etag: str, body: str, body_gzip: bytes, body_br: Optional[bytes]) -> Dict[str, Any]:
+    _snapshot_cache.clear()
+    _snapshot_cache.update({
+        'etag': etag,
+        'body': body,
+        'gzip': base64.b64encode(body_gzip).decode(),
+        'br': base64.b64encode(body_br).decode() if body_br is not None else None,
+        'expires_at': time.monotonic() + SNAPSHOT_CACHE_TTL
+    })
+    return _snapshot_cache
+
+
+def load_snapshot(db) -> Dict[str, Any]:
+    if _snapshot_cache and time.monotonic() < _snapshot_cache['expires_at']:
+        return _snapshot_cache
+
+    cur = db.cur
+    cur.execute("""
+        SELECT etag, built_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        FROM public_snapshot WHERE id = 1
+    """, (SNAPSHOT_MAX_AGE,))
+    row = cur.fetchone()
+
+    if row is None or row[1]:
+        built = build_snapshot(db, wait=row is None)
+        if built is not None:
+            return built
+
+    if _snapshot_cache and _snapshot_cache['etag'] == row[0]:
+        _snapshot_cache['expires_at'] = time.monotonic() + SNAPSHOT_CACHE_TTL
+        return _snapshot_cache
+
+    cur.execute("SELECT etag, body, body_gzip, body_br FROM public_snapshot WHERE id = 1")
+    etag, body, body_gzip, body_br = cur.fetchone()
+    return store_snapshot_cache(etag, body, bytes(body_gzip), bytes(body_br) if body_br is not None else None)
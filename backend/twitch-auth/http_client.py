@@ -0,0 +1,123 @@
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Optional, Tuple
+
+from instrumentation import phase
+
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '5'))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '2'))
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', '0.2'))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+TRANSPORT_ERRORS = (http.client.HTTPException, OSError)
+
+
+class HttpClient:
+    '''
+    Минимальный HTTP-клиент с keep-alive соединениями на хост, раздельными
+    таймаутами на подключение и чтение и повторами с экспоненциальной паузой.
+    Соединения живут всё время жизни тёплого контейнера. Неидемпотентные
+    запросы повторяются, только если запрос заведомо не дошёл до сервера:
+    не удалось отправить его или протухшее keep-alive соединение закрылось
+    без ответа. Ошибки сети после повторов пробрасываются как TRANSPORT_ERRORS.
+    '''
+
+    def __init__(self, connect_timeout: float, read_timeout: float, max_retries: int, backoff: float):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._connections: Dict[Tuple[str, str, int], http.client.HTTPConnection] = {}
+        self._lock = threading.Lock()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, Any]:
+        with phase('twitch'):
+            return self._request(method, url, body, headers)
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes],
+        headers: Optional[Dict[str, str]]
+    ) -> Tuple[int, Any]:
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += f'?{parsed.query}'
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        key = (parsed.scheme, parsed.hostname, port)
+
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            conn = self._acquire(key)
+            reused = conn.sock is not None
+            sent = False
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    conn.sock.settimeout(self.read_timeout)
+                conn.request(method, path, body=body, headers=headers or {})
+                sent = True
+                response = conn.getresponse()
+                payload = response.read()
+            except TRANSPORT_ERRORS as e:
+                conn.close()
+                unsent = not sent or (reused and isinstance(e, http.client.RemoteDisconnected))
+                if attempt >= self.max_retries or not (idempotent or unsent):
+                    raise
+            else:
+                if response.will_close:
+                    conn.close()
+                self._release(key, conn)
+                if not idempotent or response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response.status, self._decode(payload)
+
+            time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+            attempt += 1
+
+    @staticmethod
+    def _decode(payload: bytes) -> Any:
+        try:
+            return json.loads(payload.decode())
+        except ValueError:
+            return None
+
+    def _acquire(self, key: Tuple[str, str, int]) -> http.client.HTTPConnection:
+        with self._lock:
+            conn = self._connections.pop(key, None)
+        if conn is not None:
+            return conn
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.connect_timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.connect_timeout)
+
+    def _release(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            previous = self._connections.get(key)
+            self._connections[key] = conn
+        if previous is not None and previous is not conn:
+            previous.close()
+
+
+client = HttpClient(
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    max_retries=HTTP_MAX_RETRIES,
+    backoff=HTTP_RETRY_BACKOFF
+)
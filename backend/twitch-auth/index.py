@@ -1,128 +1,150 @@
+import base64
 import json
 import os
+import time
 import urllib.parse
-import urllib.request
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from core import JSON_HEADERS, Router, error_response, json_response
+from instrumentation import instrument
+from ratelimit import is_throttled, rate_limit_keys, throttled_response
 
 TWITCH_CLIENT_ID = os.environ.get('TWITCH_CLIENT_ID', '')
 TWITCH_CLIENT_SECRET = os.environ.get('TWITCH_CLIENT_SECRET', '')
 REDIRECT_URI = os.environ.get('REDIRECT_URI', 'http://localhost:5173/auth/callback')
+TWITCH_OAUTH_URL = os.environ.get('TWITCH_OAUTH_URL', 'https://id.twitch.tv/oauth2')
+TWITCH_API_URL = os.environ.get('TWITCH_API_URL', 'https://api.twitch.tv/helix')
+TWITCH_PROFILE_CACHE_TTL = float(os.environ.get('TWITCH_PROFILE_CACHE_TTL', '300'))
+TWITCH_PROFILE_CACHE_SIZE = 10000
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Twitch OAuth авторизация: получение токена и данных пользователя
-    Args: event - httpMethod, queryStringParameters с code
-          context - объект с request_id, function_name
-    Returns: JSON с пользовательскими данными или redirect URL
-    '''
-    method: str = event.get('httpMethod', 'GET')
+AUTH_URL = (
+    f"{TWITCH_OAUTH_URL}/authorize?"
+    f"client_id={TWITCH_CLIENT_ID}&"
+    f"redirect_uri={urllib.parse.quote(REDIRECT_URI)}&"
+    f"response_type=code&"
+    f"scope={urllib.parse.quote('openid user:read:email')}"
+)
+LOGIN_BODY = json.dumps({'auth_url': AUTH_URL})
+
+_profile_cache: Dict[str, Any] = {}
+
+def get_id_token_subject(id_token: Optional[str]) -> Optional[str]:
+    if not id_token:
+        return None
+    try:
+        payload = id_token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+    return claims.get('sub')
+
+def get_cached_profile(user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not user_id:
+        return None
+    cached = _profile_cache.get(user_id)
+    if cached and time.monotonic() < cached[0]:
+        return cached[1]
+    return None
+
+def cache_profile(user_data: Dict[str, Any]) -> None:
+    if not user_data.get('id'):
+        return
+    if len(_profile_cache) >= TWITCH_PROFILE_CACHE_SIZE:
+        _profile_cache.pop(next(iter(_profile_cache)))
+    _profile_cache[user_data['id']] = (time.monotonic() + TWITCH_PROFILE_CACHE_TTL, user_data)
+
+router = Router(
+    methods='GET, POST, OPTIONS',
+    allow_headers='Content-Type, X-User-Id, X-Auth-Token'
+)
+
+@router.route('GET')
+@router.route('GET', 'login')
+def login(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': dict(JSON_HEADERS),
+        'body': LOGIN_BODY,
+        'isBase64Encoded': False
+    }
+
+@router.route('GET', 'callback')
+def callback(event: Dict[str, Any]) -> Dict[str, Any]:
+    from http_client import TRANSPORT_ERRORS, client
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    params = event.get('queryStringParameters') or {}
+    code = params.get('code')
+    if not code:
+        return error_response(400, 'No authorization code provided')
     
-    if method == 'GET':
-        params = event.get('queryStringParameters', {})
-        action = params.get('action', 'login')
-        
-        if action == 'login':
-            auth_url = (
-                f"https://id.twitch.tv/oauth2/authorize?"
-                f"client_id={TWITCH_CLIENT_ID}&"
-                f"redirect_uri={urllib.parse.quote(REDIRECT_URI)}&"
-                f"response_type=code&"
-                f"scope=user:read:email"
-            )
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'auth_url': auth_url}),
-                'isBase64Encoded': False
-            }
+    if is_throttled(rate_limit_keys(event)):
+        return throttled_response()
+    
+    token_data = urllib.parse.urlencode({
+        'client_id': TWITCH_CLIENT_ID,
+        'client_secret': TWITCH_CLIENT_SECRET,
+        'code': code,
+        'grant_type': 'authorization_code',
+        'redirect_uri': REDIRECT_URI
+    }).encode()
+    
+    try:
+        token_status, token_response = client.request(
+            'POST',
+            f'{TWITCH_OAUTH_URL}/token',
+            body=token_data,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+    except TRANSPORT_ERRORS:
+        return error_response(502, 'Twitch is unavailable, try again')
+    
+    access_token = (token_response or {}).get('access_token')
+    if token_status != 200 or not access_token:
+        return error_response(400 if 400 <= token_status < 500 else 502, 'Failed to exchange authorization code')
+    
+    twitch_user_id = get_id_token_subject(token_response.get('id_token'))
+    user_data = get_cached_profile(twitch_user_id)
+    
+    if user_data is None:
+        if is_throttled(rate_limit_keys({}, twitch_user_id)):
+            return throttled_response()
         
-        elif action == 'callback':
-            code = params.get('code')
-            if not code:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'No authorization code provided'}),
-                    'isBase64Encoded': False
-                }
-            
-            token_data = urllib.parse.urlencode({
-                'client_id': TWITCH_CLIENT_ID,
-                'client_secret': TWITCH_CLIENT_SECRET,
-                'code': code,
-                'grant_type': 'authorization_code',
-                'redirect_uri': REDIRECT_URI
-            }).encode()
-            
-            token_req = urllib.request.Request(
-                'https://id.twitch.tv/oauth2/token',
-                data=token_data,
-                method='POST'
-            )
-            
-            with urllib.request.urlopen(token_req) as response:
-                token_response = json.loads(response.read().decode())
-            
-            access_token = token_response.get('access_token')
-            
-            user_req = urllib.request.Request(
-                'https://api.twitch.tv/helix/users',
+        try:
+            user_status, user_response = client.request(
+                'GET',
+                f'{TWITCH_API_URL}/users',
                 headers={
                     'Authorization': f'Bearer {access_token}',
                     'Client-Id': TWITCH_CLIENT_ID
                 }
             )
-            
-            with urllib.request.urlopen(user_req) as response:
-                user_response = json.loads(response.read().decode())
-            
-            user_data = user_response.get('data', [])[0] if user_response.get('data') else {}
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'user': {
-                        'id': user_data.get('id'),
-                        'login': user_data.get('login'),
-                        'display_name': user_data.get('display_name'),
-                        'email': user_data.get('email'),
-                        'profile_image_url': user_data.get('profile_image_url'),
-                        'created_at': user_data.get('created_at')
-                    },
-                    'access_token': access_token
-                }),
-                'isBase64Encoded': False
-            }
+        except TRANSPORT_ERRORS:
+            return error_response(502, 'Failed to fetch Twitch user')
+        
+        if user_status != 200:
+            return error_response(502, 'Failed to fetch Twitch user')
+        
+        user_data = user_response.get('data', [])[0] if (user_response or {}).get('data') else {}
+        cache_profile(user_data)
     
-    return {
-        'statusCode': 405,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
+    return json_response(200, {
+        'user': {
+            'id': user_data.get('id'),
+            'login': user_data.get('login'),
+            'display_name': user_data.get('display_name'),
+            'email': user_data.get('email'),
+            'profile_image_url': user_data.get('profile_image_url'),
+            'created_at': user_data.get('created_at')
         },
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
+        'access_token': access_token
+    })
+
+@instrument
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Twitch OAuth авторизация: получение токена и данных пользователя
+    Args: event - httpMethod, queryStringParameters с code
+          context - объект с request_id, function_name
+    Returns: JSON с пользовательскими данными или redirect URL
+    '''
+    return router.dispatch(event)
@@ -0,0 +1,97 @@
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import json_response
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'postgres')
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '5'))
+RATE_LIMIT_PER_MINUTE = float(os.environ.get('RATE_LIMIT_PER_MINUTE', '10'))
+RATE_LIMIT_MEMORY_KEYS = 10000
+RATE_LIMIT_CLEANUP_EVERY = 1000
+
+
+class TokenBucketLimiter:
+    '''
+    Token bucket в памяти тёплого контейнера: burst токенов, пополнение
+    rate токенов в секунду. Самые старые ключи вытесняются по max_keys.
+    '''
+
+    def __init__(self, burst: float, rate: float, max_keys: int):
+        self.burst = burst
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.pop(next(iter(self._buckets)))
+            self._buckets[key] = (tokens, now)
+        return allowed
+
+
+limiter = TokenBucketLimiter(RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_MEMORY_KEYS)
+_pg_calls = 0
+
+
+def consume_bucket(cur, key: str) -> bool:
+    '''
+    Пополнение и списание токена одним upsert'ом; строка не обновляется
+    и не возвращается, если токенов меньше одного.
+    '''
+    global _pg_calls
+    _pg_calls += 1
+    if _pg_calls % RATE_LIMIT_CLEANUP_EVERY == 0:
+        cur.execute(
+            "DELETE FROM rate_limit_buckets WHERE updated_at < clock_timestamp() - make_interval(secs => %s)",
+            (RATE_LIMIT_BURST / (RATE_LIMIT_PER_MINUTE / 60),)
+        )
+
+    cur.execute("""
+        INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at)
+        VALUES (%(key)s, %(burst)s - 1, clock_timestamp())
+        ON CONFLICT (key) DO UPDATE
+        SET tokens = LEAST(%(burst)s, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * %(rate)s) - 1,
+            updated_at = clock_timestamp()
+        WHERE LEAST(%(burst)s, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * %(rate)s) >= 1
+        RETURNING tokens
+    """, {'key': key, 'burst': RATE_LIMIT_BURST, 'rate': RATE_LIMIT_PER_MINUTE / 60})
+    return cur.fetchone() is not None
+
+
+def client_ip(event: Dict[str, Any]) -> Optional[str]:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('sourceIp')
+
+
+def rate_limit_keys(event: Dict[str, Any], twitch_user_id: Optional[str] = None) -> List[str]:
+    keys = []
+    ip = client_ip(event)
+    if ip:
+        keys.append(f'ip:{ip}')
+    if twitch_user_id:
+        keys.append(f'twitch:{twitch_user_id}')
+    return keys
+
+
+def is_throttled(keys: List[str], db=None) -> bool:
+    if db is None or RATE_LIMIT_BACKEND == 'memory':
+        return not all(limiter.consume(key) for key in keys)
+    allowed = all(consume_bucket(db.cur, key) for key in keys)
+    db.conn.commit()
+    return not allowed
+
+
+def throttled_response() -> Dict[str, Any]:
+    retry_after = math.ceil(60 / RATE_LIMIT_PER_MINUTE) if RATE_LIMIT_PER_MINUTE > 0 else 60
+    return json_response(429, {'error': 'Too many requests'}, {'Retry-After': str(retry_after)})
@@ -0,0 +1,148 @@
+'''
+Проверка планов горячих запросов: прогоняет EXPLAIN (ANALYZE, BUFFERS) для
+запросов из обработчиков applications и settings на засеянной базе и падает,
+если где-то появился Seq Scan по большой таблице. Каждый запрос проверяется
+дважды: с конкретными параметрами и с generic-планом, который Postgres
+выбирает для подготовленных выражений после нескольких вызовов.
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/bench python benchmarks/plan_check.py --volume 100000
+'''
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run import load_module, prepare_database  # noqa: E402
+
+WATCHED_RELATIONS = ('applications',)
+
+
+def collect_checks(cur) -> List[Tuple[str, str, tuple]]:
+    applications = load_module('applications')
+    settings = load_module('settings')
+
+    cur.execute('SELECT id, created_at FROM applications ORDER BY created_at DESC, id DESC OFFSET 100 LIMIT 1')
+    app_id, created_at = cur.fetchone()
+
+    columns = ['id', 'created_at'] + [field for field in applications.LIST_FIELDS if field not in ('id', 'created_at')]
+    limit = applications.DEFAULT_PAGE_SIZE + 1
+    build_list_query = applications.build_list_query
+
+    checks = [
+        ('get_application', applications.GET_APPLICATION_QUERY, (app_id,)),
+        ('get_applications_by_ids', applications.GET_APPLICATIONS_BY_IDS_QUERY, (list(range(app_id, app_id + 50)),)),
+        ('list', build_list_query(columns, False, False), (limit,)),
+        ('list_by_status', build_list_query(columns, True, False), (applications.APPROVED_STATUS, limit)),
+        ('list_after_cursor', build_list_query(columns, False, True), (created_at, app_id, limit)),
+        ('list_by_status_after_cursor', build_list_query(columns, True, True), (applications.APPROVED_STATUS, created_at, app_id, limit)),
+        ('list_archived', build_list_query(columns, True, False, True), (2000, applications.APPROVED_STATUS, limit)),
+        ('get_archived_application', applications.GET_ARCHIVED_APPLICATION_QUERY, (app_id, 2000)),
+        ('count_total', applications.TOTAL_QUERY, ()),
+        ('count_by_status', applications.STATUS_TOTAL_QUERY, (applications.APPROVED_STATUS,)),
+        ('check_in', applications.CHECK_IN_QUERY, (app_id,)),
+        ('settings_version', settings.SETTINGS_VERSION_QUERY, ()),
+        ('settings', settings.SETTINGS_QUERY, ()),
+        ('settings_history', settings.SETTINGS_HISTORY_QUERY, (0, settings.SETTINGS_HISTORY_DEPTH)),
+    ]
+
+    cur.execute("SELECT to_regclass('public.idx_applications_search_trgm')")
+    if cur.fetchone()[0] is not None:
+        build_search_query = applications.build_search_query
+        checks.extend([
+            ('search', build_search_query(columns, False, False), ('%bench 12%', limit)),
+            ('search_by_status', build_search_query(columns, True, False), ('%bench 12%', applications.APPROVED_STATUS, limit)),
+        ])
+    else:
+        print('search: skipped, idx_applications_search_trgm is missing (pg_trgm not installed?)')
+
+    return checks
+
+
+def walk_plan(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+
+def explain(cur, query: str, params: tuple, generic: bool) -> Dict[str, Any]:
+    to_positional = load_module('applications', 'db').to_positional
+    try:
+        if generic:
+            cur.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+            cur.execute(f'PREPARE plan_check AS {to_positional(query)}')
+            arguments = f"({', '.join(['%s'] * len(params))})" if params else ''
+            cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) EXECUTE plan_check {arguments}', params)
+        else:
+            cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}', params)
+        result = cur.fetchone()[0]
+        return (json.loads(result) if isinstance(result, str) else result)[0]
+    finally:
+        cur.connection.rollback()
+        if generic:
+            cur.execute('DEALLOCATE ALL')
+
+
+def check_plan(name: str, mode: str, explained: Dict[str, Any], watched: Tuple[str, ...]) -> bool:
+    plan = explained['Plan']
+    seq_scans = []
+    index_scans = []
+    for node in walk_plan(plan):
+        relation = node.get('Relation Name')
+        if node['Node Type'] == 'Seq Scan' and relation in watched:
+            seq_scans.append(relation)
+        if node.get('Index Name'):
+            index_scans.append(node['Index Name'])
+
+    ok = not seq_scans
+    print(
+        f"{'ok  ' if ok else 'FAIL'} {name:<28} {mode:<7} {explained['Execution Time']:>8.3f}ms "
+        f"hit={plan.get('Shared Hit Blocks', 0):<6} read={plan.get('Shared Read Blocks', 0):<6} "
+        f"{'seq scan on ' + ', '.join(seq_scans) if seq_scans else ', '.join(dict.fromkeys(index_scans)) or '-'}"
+    )
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Fail when hot queries degrade to sequential scans')
+    parser.add_argument('--database-url', help='defaults to $DATABASE_URL')
+    parser.add_argument('--volume', type=int, default=100000, help='number of applications to seed')
+    parser.add_argument('--reset', action='store_true', help='drop the public schema and re-apply migrations')
+    parser.add_argument('--watch', nargs='+', default=list(WATCHED_RELATIONS), help='tables that must never be seq-scanned')
+    args = parser.parse_args()
+
+    database_url = args.database_url or os.environ.get('DATABASE_URL')
+    if not database_url:
+        print('DATABASE_URL or --database-url is required', file=sys.stderr)
+        return 2
+    os.environ['DATABASE_URL'] = database_url
+
+    prepare_database(database_url, args.volume, args.reset)
+
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    cur = conn.cursor()
+    failures = 0
+    try:
+        for name, query, params in collect_checks(cur):
+            for generic in (False, True):
+                explained = explain(cur, query, params, generic)
+                if not check_plan(name, 'generic' if generic else 'custom', explained, tuple(args.watch)):
+                    failures += 1
+    finally:
+        cur.close()
+        conn.close()
+
+    if failures:
+        print(f'{failures} plan(s) fell back to a sequential scan')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+'''
+Нагрузочные замеры облачных функций: вызывает handler(event, context)
+напрямую против локального Postgres с заданным объёмом заявок.
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/bench python benchmarks/run.py run \
+        --volume 100000 --iterations 500 --output after.json
+    python benchmarks/run.py compare before.json after.json --threshold 0.15
+'''
+import argparse
+import base64
+import contextlib
+import hashlib
+import hmac
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / 'backend'
+MIGRATIONS = ROOT / 'db_migrations'
+FUNCTION_MODULES = ('index', 'core', 'db', 'instrumentation', 'http_client', 'qr', 'snapshot', 'ratelimit')
+SCENARIOS = ('list', 'get_by_id', 'create', 'update', 'checkin', 'settings_get')
+STATUSES = ('new', 'approved', 'rejected')
+
+
+class Context:
+    def __init__(self, function_name: str, request_id: str):
+        self.function_name = function_name
+        self.request_id = request_id
+
+
+def load_module(function_name: str, module_name: str = 'index') -> Any:
+    function_dir = BACKEND / function_name
+    for name in FUNCTION_MODULES:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, str(function_dir))
+    try:
+        spec = importlib.util.spec_from_file_location(f'{function_name}_{module_name}', function_dir / f'{module_name}.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(function_dir))
+        for name in FUNCTION_MODULES:
+            sys.modules.pop(name, None)
+    return module
+
+
+def load_handler(function_name: str) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    return load_module(function_name).handler
+
+
+def prepare_database(database_url: str, volume: int, reset: bool) -> None:
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    if reset:
+        cur.execute('DROP SCHEMA public CASCADE')
+        cur.execute('CREATE SCHEMA public')
+
+    cur.execute("SELECT to_regclass('public.applications')")
+    if cur.fetchone()[0] is None:
+        for migration in sorted(MIGRATIONS.glob('V*.sql')):
+            cur.execute(migration.read_text())
+
+    cur.execute('SELECT COUNT(*) FROM applications')
+    missing = volume - cur.fetchone()[0]
+    if missing > 0:
+        cur.execute("""
+            INSERT INTO applications (
+                name, contact, twitch_link, about, status,
+                twitch_user_id, twitch_display_name, twitch_avatar_url, created_at
+            )
+            SELECT 'Bench ' || n, '@bench' || n, 'twitch.tv/bench' || n, repeat('about ', 20),
+                   (%s::text[])[1 + n %% 3],
+                   'bench-' || n || '-' || md5(random()::text), 'Bench' || n,
+                   'https://static-cdn.jtvnw.net/bench/' || n || '.png',
+                   CURRENT_TIMESTAMP - (n || ' seconds')::interval
+            FROM generate_series(1, %s) AS n
+        """, (list(STATUSES), missing))
+    cur.execute('ANALYZE applications')
+    cur.execute('ANALYZE event_settings')
+
+    cur.close()
+    conn.close()
+
+
+def build_event(scenario: str, volume: int, rng: random.Random) -> Dict[str, Any]:
+    if scenario == 'list':
+        params = {'limit': '50'}
+        if rng.random() < 0.5:
+            params['status'] = rng.choice(STATUSES)
+        return {'httpMethod': 'GET', 'queryStringParameters': params}
+    if scenario == 'get_by_id':
+        return {'httpMethod': 'GET', 'queryStringParameters': {'id': str(rng.randint(1, volume))}}
+    if scenario == 'create':
+        n = rng.getrandbits(48)
+        return {'httpMethod': 'POST', 'body': json.dumps({
+            'name': f'Bench {n}',
+            'contact': f'@bench{n}',
+            'about': 'benchmark submission'
+        })}
+    if scenario == 'checkin':
+        app_id = rng.randint(1, volume)
+        digest = hmac.new(os.environ['CHECKIN_SECRET'].encode(), str(app_id).encode(), hashlib.sha256).digest()
+        token = f'brotherhood:{app_id}:{base64.urlsafe_b64encode(digest[:12]).decode()}'
+        return {'httpMethod': 'POST', 'queryStringParameters': {'action': 'checkin'}, 'body': json.dumps({'token': token})}
+    if scenario == 'update':
+        return {'httpMethod': 'PUT', 'body': json.dumps({
+            'id': rng.randint(1, volume),
+            'status': rng.choice(STATUSES)
+        })}
+    return {'httpMethod': 'GET', 'queryStringParameters': {}}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_scenario(
+    handler: Callable[[Dict[str, Any], Any], Dict[str, Any]],
+    function_name: str,
+    scenario: str,
+    volume: int,
+    iterations: int,
+    concurrency: int,
+    seed: int
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    events = [build_event(scenario, volume, rng) for _ in range(iterations)]
+
+    def invoke(i: int) -> Tuple[float, bool]:
+        start = time.perf_counter()
+        response = handler(events[i], Context(function_name, f'bench-{scenario}-{i}'))
+        return time.perf_counter() - start, response['statusCode'] < 500
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(min(10, iterations)):
+            invoke(i)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(invoke, range(iterations)))
+        wall = time.perf_counter() - started
+
+    samples = [elapsed for elapsed, _ in outcomes]
+    errors = sum(1 for _, ok in outcomes if not ok)
+
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'throughput_rps': round(iterations / wall, 1)
+    }
+
+
+def command_run(args: argparse.Namespace) -> int:
+    database_url = args.database_url or os.environ.get('DATABASE_URL')
+    if not database_url:
+        print('DATABASE_URL or --database-url is required', file=sys.stderr)
+        return 2
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(max(4, args.concurrency)))
+    os.environ.setdefault('CHECKIN_SECRET', 'bench-checkin-secret')
+
+    prepare_database(database_url, args.volume, args.reset)
+
+    handlers = {
+        'applications': load_handler('applications'),
+        'settings': load_handler('settings')
+    }
+
+    results: Dict[str, Any] = {}
+    for scenario in args.scenarios:
+        function_name = 'settings' if scenario == 'settings_get' else 'applications'
+        results[scenario] = run_scenario(
+            handlers[function_name], function_name, scenario,
+            args.volume, args.iterations, args.concurrency, args.seed
+        )
+        stats = results[scenario]
+        print(
+            f"{scenario:<14} p50={stats['p50_ms']:>9.3f}ms p95={stats['p95_ms']:>9.3f}ms "
+            f"p99={stats['p99_ms']:>9.3f}ms {stats['throughput_rps']:>9.1f} rps"
+        )
+
+    report = {
+        'volume': args.volume,
+        'iterations': args.iterations,
+        'concurrency': args.concurrency,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+    return 0
+
+
+def command_compare(args: argparse.Namespace) -> int:
+    baseline = json.loads(Path(args.baseline).read_text())
+    candidate = json.loads(Path(args.candidate).read_text())
+    regressions = []
+
+    print(f"{'scenario':<14} {'metric':<8} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for scenario, before in baseline['results'].items():
+        after = candidate['results'].get(scenario)
+        if after is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            marker = ''
+            if metric == args.metric and change > args.threshold:
+                regressions.append(scenario)
+                marker = '  REGRESSION'
+            print(
+                f'{scenario:<14} {metric:<8} {before[metric]:>10.3f} {after[metric]:>10.3f} '
+                f'{change:>+7.1%}{marker}'
+            )
+
+    if regressions:
+        print(f"{args.metric} regressed by more than {args.threshold:.0%} in: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark cloud-function handlers against a local Postgres')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='seed the database and benchmark the handlers')
+    run.add_argument('--database-url', help='defaults to $DATABASE_URL')
+    run.add_argument('--volume', type=int, default=1000, help='number of applications to seed')
+    run.add_argument('--iterations', type=int, default=200)
+    run.add_argument('--concurrency', type=int, default=1)
+    run.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--reset', action='store_true', help='drop the public schema and re-apply migrations')
+    run.add_argument('--output', help='write results as JSON for later comparison')
+    run.set_defaults(func=command_run)
+
+    compare = commands.add_parser('compare', help='compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.add_argument('--metric', choices=('p50_ms', 'p95_ms', 'p99_ms'), default='p95_ms')
+    compare.add_argument('--threshold', type=float, default=0.1, help='allowed relative slowdown')
+    compare.set_defaults(func=command_compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
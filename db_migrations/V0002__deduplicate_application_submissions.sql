@@ -0,0 +1,35 @@
+-- Track client-supplied idempotency keys for application submissions
+ALTER TABLE applications ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+
+-- Duplicate submissions removed by this migration are kept here for review
+CREATE TABLE IF NOT EXISTS applications_duplicates (
+    LIKE applications,
+    kept_id INTEGER NOT NULL,
+    moved_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+-- Keep one application per Twitch user: the most advanced moderation decision
+-- (approved, then any other decision, then new), the earliest among equals
+WITH ranked AS (
+    SELECT id, first_value(id) OVER (
+        PARTITION BY twitch_user_id
+        ORDER BY CASE status WHEN 'approved' THEN 0 WHEN 'new' THEN 2 ELSE 1 END, id
+    ) AS kept_id
+    FROM applications
+    WHERE twitch_user_id IS NOT NULL
+), moved AS (
+    DELETE FROM applications a
+    USING ranked r
+    WHERE a.id = r.id AND r.id <> r.kept_id
+    RETURNING a.*, r.kept_id
+)
+INSERT INTO applications_duplicates
+SELECT * FROM moved;
+
+-- One application per Twitch user and per idempotency key
+DROP INDEX IF EXISTS idx_applications_twitch_user_id;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_applications_twitch_user_id
+    ON applications(twitch_user_id) WHERE twitch_user_id IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_applications_idempotency_key
+    ON applications(idempotency_key) WHERE idempotency_key IS NOT NULL;
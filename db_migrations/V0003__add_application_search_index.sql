@@ -0,0 +1,6 @@
+-- Trigram index for substring search over applicant name, contact and Twitch display name
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_applications_search_trgm ON applications USING gin (
+    (COALESCE(name, '') || ' ' || COALESCE(contact, '') || ' ' || COALESCE(twitch_display_name, '')) gin_trgm_ops
+);
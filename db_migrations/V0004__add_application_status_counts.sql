@@ -0,0 +1,58 @@
+-- Per-status application totals maintained by statement-level triggers
+CREATE TABLE IF NOT EXISTS application_status_counts (
+    status VARCHAR(50) PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION apply_application_status_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO application_status_counts (status, total)
+        SELECT COALESCE(status, ''), COUNT(*) FROM new_rows GROUP BY 1
+        ON CONFLICT (status) DO UPDATE SET total = application_status_counts.total + EXCLUDED.total;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO application_status_counts (status, total)
+        SELECT COALESCE(status, ''), -COUNT(*) FROM old_rows GROUP BY 1
+        ON CONFLICT (status) DO UPDATE SET total = application_status_counts.total + EXCLUDED.total;
+    ELSE
+        INSERT INTO application_status_counts (status, total)
+        SELECT status, SUM(delta) FROM (
+            SELECT COALESCE(status, '') AS status, COUNT(*) AS delta FROM new_rows GROUP BY 1
+            UNION ALL
+            SELECT COALESCE(status, '') AS status, -COUNT(*) AS delta FROM old_rows GROUP BY 1
+        ) AS changes
+        GROUP BY status
+        HAVING SUM(delta) <> 0
+        ON CONFLICT (status) DO UPDATE SET total = application_status_counts.total + EXCLUDED.total;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_applications_status_counts_insert ON applications;
+CREATE TRIGGER trg_applications_status_counts_insert
+    AFTER INSERT ON applications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_application_status_counts();
+
+DROP TRIGGER IF EXISTS trg_applications_status_counts_update ON applications;
+CREATE TRIGGER trg_applications_status_counts_update
+    AFTER UPDATE ON applications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_application_status_counts();
+
+DROP TRIGGER IF EXISTS trg_applications_status_counts_delete ON applications;
+CREATE TRIGGER trg_applications_status_counts_delete
+    AFTER DELETE ON applications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_application_status_counts();
+
+-- Backfill from the current table contents while writers are blocked
+DO $$
+BEGIN
+    LOCK TABLE applications IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM application_status_counts;
+    INSERT INTO application_status_counts (status, total)
+    SELECT COALESCE(status, ''), COUNT(*) FROM applications GROUP BY 1;
+END;
+$$;
@@ -0,0 +1,18 @@
+-- Outbox for buffered application submissions, drained into applications in batches
+CREATE TABLE IF NOT EXISTS application_submissions (
+    id BIGSERIAL PRIMARY KEY,
+    idempotency_key VARCHAR(255) NOT NULL,
+    payload JSONB NOT NULL,
+    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP,
+    application_id INTEGER REFERENCES applications(id) ON DELETE SET NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_application_submissions_idempotency_key
+    ON application_submissions(idempotency_key);
+CREATE INDEX IF NOT EXISTS idx_application_submissions_pending
+    ON application_submissions(id) WHERE processed_at IS NULL;
+-- Backs the ON DELETE SET NULL lookup, so deleting or archiving applications
+-- does not scan the whole outbox
+CREATE INDEX IF NOT EXISTS idx_application_submissions_application_id
+    ON application_submissions(application_id);
@@ -0,0 +1,9 @@
+-- Content-addressed store of rendered QR codes; applications point at it by hash
+CREATE TABLE IF NOT EXISTS qr_images (
+    hash CHAR(64) PRIMARY KEY,
+    payload VARCHAR(500) NOT NULL,
+    svg TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE applications ADD COLUMN IF NOT EXISTS qr_hash CHAR(64);
@@ -0,0 +1,2 @@
+-- Door check-in timestamp. Deliberately left unindexed so check-in updates stay HOT
+ALTER TABLE applications ADD COLUMN IF NOT EXISTS checked_in_at TIMESTAMP;
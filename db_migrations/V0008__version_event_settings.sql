@@ -0,0 +1,17 @@
+-- Monotonic settings version plus a log of which fields each version changed,
+-- so clients can fetch only the fields changed since the version they hold
+ALTER TABLE event_settings ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+CREATE TABLE IF NOT EXISTS event_settings_versions (
+    version INTEGER PRIMARY KEY,
+    changed_fields TEXT[] NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO event_settings_versions (version, changed_fields)
+SELECT 1, ARRAY[
+    'event_name', 'event_slogan', 'event_date', 'event_location',
+    'organizer_name', 'organizer_contact', 'program_data', 'about_content'
+]
+WHERE EXISTS (SELECT 1 FROM event_settings)
+ON CONFLICT (version) DO NOTHING;
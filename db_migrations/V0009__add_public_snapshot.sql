@@ -0,0 +1,9 @@
+-- Pre-serialised public landing-page payload, rebuilt on settings and status changes
+CREATE TABLE IF NOT EXISTS public_snapshot (
+    id SMALLINT PRIMARY KEY CHECK (id = 1),
+    etag VARCHAR(64) NOT NULL,
+    body TEXT NOT NULL,
+    body_gzip BYTEA NOT NULL,
+    body_br BYTEA,
+    built_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
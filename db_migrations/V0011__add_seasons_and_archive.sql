@@ -0,0 +1,75 @@
+-- Event season dimension. applications holds only the current season; closed
+-- seasons are moved to applications_archive when the settings season advances.
+ALTER TABLE event_settings ADD COLUMN IF NOT EXISTS season INTEGER NOT NULL DEFAULT EXTRACT(YEAR FROM CURRENT_DATE)::integer;
+
+CREATE OR REPLACE FUNCTION current_season() RETURNS INTEGER AS $$
+    SELECT COALESCE(
+        (SELECT season FROM event_settings ORDER BY id DESC LIMIT 1),
+        EXTRACT(YEAR FROM CURRENT_DATE)::integer
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Add the column with a constant default first so existing rows are not rewritten
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'applications' AND column_name = 'season'
+    ) THEN
+        EXECUTE format('ALTER TABLE applications ADD COLUMN season INTEGER NOT NULL DEFAULT %s', current_season());
+    END IF;
+END;
+$$;
+ALTER TABLE applications ALTER COLUMN season SET DEFAULT current_season();
+
+-- Keep the column list in sync with applications when adding columns there
+CREATE TABLE IF NOT EXISTS applications_archive (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    contact VARCHAR(255) NOT NULL,
+    twitch_link VARCHAR(500),
+    about TEXT,
+    status VARCHAR(50),
+    twitch_user_id VARCHAR(100),
+    twitch_display_name VARCHAR(255),
+    twitch_avatar_url TEXT,
+    twitch_email VARCHAR(255),
+    qr_code VARCHAR(500),
+    qr_hash CHAR(64),
+    checked_in_at TIMESTAMP,
+    idempotency_key VARCHAR(255),
+    season INTEGER NOT NULL,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_applications_archive_season_created_at
+    ON applications_archive(season, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_applications_archive_season_status
+    ON applications_archive(season, status);
+
+CREATE OR REPLACE FUNCTION archive_seasons_before(p_season INTEGER) RETURNS BIGINT AS $$
+DECLARE
+    moved BIGINT;
+BEGIN
+    -- Wait for in-flight inserts, which took the old season as their default,
+    -- and hold off new ones until the season change commits
+    LOCK TABLE applications IN SHARE ROW EXCLUSIVE MODE;
+    WITH closed AS (
+        DELETE FROM applications WHERE season < p_season RETURNING *
+    )
+    INSERT INTO applications_archive (
+        id, name, contact, twitch_link, about, status,
+        twitch_user_id, twitch_display_name, twitch_avatar_url, twitch_email,
+        qr_code, qr_hash, checked_in_at, idempotency_key, season, created_at, updated_at
+    )
+    SELECT
+        id, name, contact, twitch_link, about, status,
+        twitch_user_id, twitch_display_name, twitch_avatar_url, twitch_email,
+        qr_code, qr_hash, checked_in_at, idempotency_key, season, created_at, updated_at
+    FROM closed;
+    GET DIAGNOSTICS moved = ROW_COUNT;
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
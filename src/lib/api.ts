@@ -11,6 +11,9 @@ export interface Application {
   twitch_link?: string;
   about?: string;
   status?: string;
+  qr_code?: string;
+  qr_hash?: string;
+  checked_in_at?: string;
   twitch_user?: {
     id?: string;
     display_name?: string;
@@ -30,28 +33,51 @@ export interface EventSettings {
   organizer_contact?: string;
   program_data?: any;
   about_content?: string;
+  season?: number;
+  version?: number;
 }
 
 export const api = {
-  async getApplications(status?: string) {
-    const url = status 
-      ? `${API_URLS.applications}?status=${status}`
-      : API_URLS.applications;
+  async getApplications(status?: string, page?: { cursor?: string; limit?: number; fields?: string[]; q?: string; season?: number }) {
+    const params = new URLSearchParams();
+    if (status) params.set('status', status);
+    if (page?.q) params.set('q', page.q);
+    if (page?.season) params.set('season', String(page.season));
+    if (page?.cursor) params.set('cursor', page.cursor);
+    if (page?.limit) params.set('limit', String(page.limit));
+    if (page?.fields) params.set('fields', page.fields.join(','));
+    const query = params.toString();
+    const url = query ? `${API_URLS.applications}?${query}` : API_URLS.applications;
     const response = await fetch(url);
     if (!response.ok) throw new Error('Failed to fetch applications');
     return response.json();
   },
 
+  async getApplicationStats() {
+    const response = await fetch(`${API_URLS.applications}?action=stats`);
+    if (!response.ok) throw new Error('Failed to fetch application stats');
+    return response.json();
+  },
+
   async getApplication(id: number) {
     const response = await fetch(`${API_URLS.applications}?id=${id}`);
     if (!response.ok) throw new Error('Failed to fetch application');
     return response.json();
   },
 
-  async createApplication(data: Application) {
+  async getApplicationsByIds(ids: number[]) {
+    const response = await fetch(`${API_URLS.applications}?ids=${ids.join(',')}`);
+    if (!response.ok) throw new Error('Failed to fetch applications');
+    return response.json();
+  },
+
+  async createApplication(data: Application, idempotencyKey?: string) {
     const response = await fetch(API_URLS.applications, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: {
+        'Content-Type': 'application/json',
+        ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
+      },
       body: JSON.stringify(data),
     });
     if (!response.ok) throw new Error('Failed to create application');
@@ -68,12 +94,79 @@ export const api = {
     return response.json();
   },
 
+  async updateApplications(items: Array<{ id: number; status?: string; qr_code?: string }>) {
+    const response = await fetch(API_URLS.applications, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ items }),
+    });
+    if (!response.ok) throw new Error('Failed to update applications');
+    return response.json();
+  },
+
+  async generateQrCodes(ids?: number[], regenerate = false, afterId?: number) {
+    const response = await fetch(`${API_URLS.applications}?action=qr`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ...(ids ? { ids } : {}), regenerate, ...(afterId !== undefined ? { after_id: afterId } : {}) }),
+    });
+    if (!response.ok) throw new Error('Failed to generate QR codes');
+    return response.json();
+  },
+
+  qrImageUrl(hash: string) {
+    return `${API_URLS.applications}?action=qr&hash=${hash}`;
+  },
+
+  async checkIn(token: string) {
+    const response = await fetch(`${API_URLS.applications}?action=checkin`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ token }),
+    });
+    if (!response.ok && response.status !== 409) throw new Error('Failed to check in');
+    return response.json();
+  },
+
+  async syncCheckIns(items: Array<{ token: string; scanned_at: string }>) {
+    const response = await fetch(`${API_URLS.applications}?action=checkin`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ items }),
+    });
+    if (!response.ok) throw new Error('Failed to sync check-ins');
+    return response.json();
+  },
+
   async getSettings() {
     const response = await fetch(API_URLS.settings);
     if (!response.ok) throw new Error('Failed to fetch settings');
     return response.json();
   },
 
+  async getPublicSnapshot() {
+    const response = await fetch(`${API_URLS.settings}?action=public`);
+    if (!response.ok) throw new Error('Failed to fetch event data');
+    return response.json();
+  },
+
+  async getSettingsSince(version: number) {
+    const response = await fetch(`${API_URLS.settings}?since_version=${version}`);
+    if (response.status === 204) return null;
+    if (!response.ok) throw new Error('Failed to fetch settings');
+    return response.json();
+  },
+
+  async patchProgram(operations: Array<{ op: 'set' | 'remove'; path: Array<string | number>; value?: any }>) {
+    const response = await fetch(API_URLS.settings, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ program_patch: operations }),
+    });
+    if (!response.ok) throw new Error('Failed to update program');
+    return response.json();
+  },
+
   async updateSettings(data: Partial<EventSettings>) {
     const response = await fetch(API_URLS.settings, {
       method: 'PUT',
@@ -13,6 +13,8 @@ import { api } from '@/lib/api';
 
 export default function Admin() {
   const [applications, setApplications] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [totalApplications, setTotalApplications] = useState<number | null>(null);
   const [settings, setSettings] = useState<any>({
     event_name: '',
     event_slogan: '',
@@ -30,10 +32,13 @@ export default function Admin() {
     loadSettings();
   }, []);
 
-  const loadApplications = async () => {
+  const loadApplications = async (cursor?: string) => {
     try {
-      const data = await api.getApplications();
-      setApplications(data.applications || []);
+      const data = await api.getApplications(undefined, { cursor });
+      const page = data.applications || [];
+      setApplications((current) => (cursor ? [...current, ...page] : page));
+      setNextCursor(data.next_cursor || null);
+      setTotalApplications(data.total ?? null);
     } catch (error) {
       toast.error('Ошибка загрузки заявок');
       console.error(error);
@@ -67,13 +72,22 @@ export default function Admin() {
     try {
       await api.updateApplication(id, { status });
       toast.success('Статус обновлен');
-      loadApplications();
+      setApplications((current) => current.map((app) => (app.id === id ? { ...app, status } : app)));
     } catch (error) {
       toast.error('Ошибка обновления статуса');
       console.error(error);
     }
   };
 
+  const handleSelectApplication = async (id: number) => {
+    try {
+      setSelectedApp(await api.getApplication(id));
+    } catch (error) {
+      toast.error('Ошибка загрузки заявки');
+      console.error(error);
+    }
+  };
+
   const getStatusBadge = (status: string) => {
     const colors: any = {
       new: 'bg-blue-500/20 text-blue-500 border-blue-500/30',
@@ -194,7 +208,7 @@ export default function Admin() {
                             <Button
                               size="sm"
                               variant="outline"
-                              onClick={() => setSelectedApp(app)}
+                              onClick={() => handleSelectApplication(app.id)}
                             >
                               <Icon name="Eye" size={16} />
                             </Button>
@@ -205,6 +219,20 @@ export default function Admin() {
                   </TableBody>
                 </Table>
               </div>
+
+              {(nextCursor || totalApplications !== null) && (
+                <div className="flex items-center justify-between mt-4">
+                  <span className="text-sm text-muted-foreground">
+                    Показано {applications.length}{totalApplications !== null ? ` из ${totalApplications}` : ''}
+                  </span>
+                  {nextCursor && (
+                    <Button variant="outline" size="sm" onClick={() => loadApplications(nextCursor)}>
+                      <Icon name="ChevronDown" className="mr-2" size={16} />
+                      Загрузить ещё
+                    </Button>
+                  )}
+                </div>
+              )}
             </Card>
 
             {selectedApp && (
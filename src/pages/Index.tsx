@@ -18,10 +18,11 @@ export default function Index() {
     twitchLink: '',
     about: ''
   });
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
+  const [isSubmitting, setIsSubmitting] = useState(false);
 
   useEffect(() => {
-    loadSettings();
-    loadApplicationCount();
+    loadPublicData();
     
     const urlParams = new URLSearchParams(window.location.search);
     const code = urlParams.get('code');
@@ -30,21 +31,13 @@ export default function Index() {
     }
   }, []);
 
-  const loadSettings = async () => {
+  const loadPublicData = async () => {
     try {
-      const data = await api.getSettings();
-      setSettings(data);
+      const data = await api.getPublicSnapshot();
+      setSettings(data.settings);
+      setApplicationCount(data.counts.total || 0);
     } catch (error) {
-      console.error('Failed to load settings:', error);
-    }
-  };
-
-  const loadApplicationCount = async () => {
-    try {
-      const data = await api.getApplications();
-      setApplicationCount(data.total || 0);
-    } catch (error) {
-      console.error('Failed to load applications:', error);
+      console.error('Failed to load event data:', error);
     }
   };
 
@@ -77,11 +70,13 @@ export default function Index() {
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
+    if (isSubmitting) return;
     if (!formData.name || !formData.contact) {
       toast.error('Заполни имя и контакт, братух!');
       return;
     }
     
+    setIsSubmitting(true);
     try {
       await api.createApplication({
         name: formData.name,
@@ -89,15 +84,18 @@ export default function Index() {
         twitch_link: formData.twitchLink,
         about: formData.about,
         twitch_user: twitchUser
-      });
+      }, idempotencyKey);
       
       setApplicationCount(prev => prev + 1);
       toast.success('Заявка отправлена в стаю! 🚀');
       setFormData({ name: '', contact: '', twitchLink: '', about: '' });
       setTwitchUser(null);
+      setIdempotencyKey(crypto.randomUUID());
     } catch (error) {
       toast.error('Ошибка отправки заявки');
       console.error(error);
+    } finally {
+      setIsSubmitting(false);
     }
   };
 
@@ -334,7 +332,7 @@ export default function Index() {
                 />
               </div>
 
-              <Button type="submit" size="lg" className="w-full bg-primary hover:bg-primary/90 text-lg py-6">
+              <Button type="submit" size="lg" disabled={isSubmitting} className="w-full bg-primary hover:bg-primary/90 text-lg py-6">
                 <Icon name="Send" className="mr-2" />
                 Отправить заявку в стаю
               </Button>